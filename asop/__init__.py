@@ -1,2 +1,8 @@
 from asop import ASOP, MINIMIZE, MAXIMIZE
-import variableTypes
\ No newline at end of file
+from population import Population
+from archive import EliteArchive
+from cache import EvaluationCache
+from instrumentation import Instrumentation
+import variableTypes
+import convergence
+from bank import DimensionBank
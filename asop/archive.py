@@ -0,0 +1,102 @@
+'''
+Bounded archive of the best solutions seen by an optimizer
+'''
+import heapq
+
+import numpy as np
+
+from population import Population
+
+
+class EliteArchive(object):
+    '''Fixed capacity "hall of fame" of the best solutions
+
+    The solutions and the values are stored in preallocated arrays. A heap
+    of (goodness, slot) pairs keeps the worst archived solution on top, so
+    that an insertion costs O(log capacity). A batch of n candidates is
+    first reduced to its `capacity` best members by partial partitioning,
+    so that only solutions that may enter the archive reach the heap.
+    '''
+
+    def __init__(self, capacity, direction=-1):
+        '''
+        @param capacity: maximal number of archived solutions
+        @param direction: MINIMIZE (-1, default) or MAXIMIZE (1)
+        '''
+
+        assert capacity > 0
+        assert direction in (-1, 1)
+        self.capacity = int(capacity)
+        self.direction = direction
+        self._heap = []
+        self._solutions = None #allocated upon the first insertion
+        self._values = np.empty(self.capacity)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __repr__(self):
+        return '<%s> %d of %d'%(self.__class__.__name__, len(self),
+                                self.capacity)
+
+    def update(self, solutions, values):
+        '''Offer a batch of evaluated solutions to the archive
+
+        @param solutions: sequence of solutions or an array with one
+            solution per row
+        @param values: the corresponding objective function values. NaN
+            values are ignored
+        @return: number of solutions that entered the archive
+        '''
+
+        values = np.asarray(values, dtype=float).ravel()
+        assert len(solutions) == len(values)
+        goodness = values * self.direction
+        candidates = np.flatnonzero(~np.isnan(goodness))
+        if len(candidates) > self.capacity:
+            part = np.argpartition(-goodness[candidates], self.capacity - 1)
+            candidates = candidates[part[:self.capacity]]
+        if len(self._heap) == self.capacity:
+            candidates = candidates[goodness[candidates] > self._heap[0][0]]
+        if len(candidates) == 0:
+            return 0
+        solutions = np.asarray(solutions)
+        if self._solutions is None:
+            self._solutions = np.empty((self.capacity, ) + solutions.shape[1:],
+                                       dtype=solutions.dtype)
+
+        nInserted = 0
+        heap = self._heap
+        for ix in candidates:
+            g = goodness[ix]
+            if len(heap) < self.capacity:
+                slot = len(heap)
+                heapq.heappush(heap, (g, slot))
+            elif g > heap[0][0]:
+                slot = heapq.heapreplace(heap, (g, heap[0][1]))[1]
+            else:
+                continue
+            self._solutions[slot] = solutions[ix]
+            self._values[slot] = values[ix]
+            nInserted += 1
+        return nInserted
+
+    @property
+    def worstValue(self):
+        '''The value of the worst archived solution, None if empty'''
+        if not self._heap:
+            return None
+        return self._values[self._heap[0][1]]
+
+    def best(self, k=None):
+        '''`Population` of the `k` best archived solutions (default: all of
+        them), the best one first'''
+
+        n = len(self._heap)
+        if n == 0:
+            return Population(np.empty((0, 0)), [], direction=self.direction)
+        population = Population(self._solutions[:n], self._values[:n],
+                                direction=self.direction)
+        if k is None:
+            k = n
+        return population.best(k)
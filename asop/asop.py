@@ -1,8 +1,26 @@
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
 import variableTypes
 import scaling
+from population import Population
+from archive import EliteArchive
+from cache import EvaluationCache
+from instrumentation import Instrumentation, NULL_PHASE
+from bank import DimensionBank
+import checkpoint
+import convergence
 
 MINIMIZE, MAXIMIZE = (-1, 1)
 
+#marks the solutions that are not in the evaluation cache
+_MISSING = object()
+
+#learning modes. See the documentation of ASOP.__init__
+LEARNING_MODES = ('sequential', 'batch', 'histogram')
+
 class ASOP:
     '''The main class for ASOP algorithm
 
@@ -10,10 +28,19 @@ class ASOP:
 
 
     def __init__(self, func, dimensions=None, direction=MINIMIZE,
-                 scaling=None):
+                 scaling=None, learning='sequential',
+                 executor=None, workers=None, chunksize=None,
+                 vectorized=False, tellBatchSize=1, archiveSize=0,
+                 dtype=None, bank=False, bankFile=None,
+                 checkpointFile=None, checkpointEvery=1, cacheSize=0,
+                 deduplicate=False, instrumentation=None):
         '''
 
-        @param func: callable. The objective function that needs to be optimized
+        @param func: callable or None. The objective function that needs to
+            be optimized. If None, `train` is disabled and the optimization
+            is performed either by `sample`-ing, evaluating the samples
+            externally and calling `learn`, or through the `ask`/`tell`
+            interface
         @param dimensions: either None, a number or list
             of Variable type objects. If None, the proper number of dimensions
             will be guessed. If `dimensions` is a number, then this number of
@@ -27,28 +54,251 @@ class ASOP:
             number. If "auto" is passed as argument, scaling function will
             be created during the first call to `learn` by passing the
             `values` arguments to `scaling.tanhScalingFromValueExtrema`
+        @param learning: how `learn` updates the dimensions. One of the
+            following:
+            "sequential" (default) -- one `alterSamplingDistribution` call
+                per (solution, dimension) pair.
+            "batch" -- every dimension receives the entire column
+                of locations and scaled values and updates itself in a few
+                array operations. In this mode the scaling function is
+                called with an array of values. All the functions created by
+                the `scaling` module support that. A scaling function that
+                fails on arrays (raises TypeError or ValueError, or returns
+                a result of another shape) is called once per value.
+            "histogram" -- like "batch", but every dimension bins the
+                update amounts onto its sampling values and convolves the
+                resulting histogram with the update kernel once. Suits very
+                large populations. See
+                `QuantitativeVariableBase._updateInternalSamplingScoreHistogram`
+        @param executor: how `train` evaluates the objective function.
+            One of the following:
+            None (default) -- serial evaluation in the calling thread
+            "thread" -- a pool of `workers` threads. Suits objective
+                functions that release the GIL (I/O, numerical libraries)
+            "process" -- a pool of `workers` processes. Suits pure Python
+                objective functions. Note that in this case `func` has to be
+                picklable (e.g. a module-level function)
+            Any object with a `map(func, iterable)` method that returns the
+                results in the order of `iterable` (e.g. a
+                `multiprocessing.Pool`). Such an object is used as is and
+                is not closed by `close`
+            The pools are created upon the first call to `train`. Call
+            `close` to release them.
+        @param workers: number of workers in the "thread" or "process" pool.
+            Default: the number of CPUs
+        @param chunksize: number of solutions submitted to a pool worker at
+            once. Default: the sample is split to four chunks per worker
+        @param vectorized: if True, `func` is called once per `train` call
+            with an (n, D) array of solutions (one solution per row) and
+            has to return a sequence of n values. Default: False, i.e. `func`
+            is called once per solution with a D-tuple. In the vectorized
+            mode an executor evaluates row chunks of the array (see
+            `chunksize`)
+        @param tellBatchSize: `tell` folds the reported results into the
+            distributions as soon as at least this number of results is
+            waiting. Default: 1, i.e. every `tell` call is learned
+            immediately. See `tell`
+        @param archiveSize: if positive, the optimizer keeps an
+            `EliteArchive` of this capacity in `self.archive`. Every
+            solution passed to `learn` (and thus every solution evaluated
+            by `train` or reported by `tell`) is offered to the archive.
+            Default: 0, i.e. no archive (`self.archive` is None)
+        @param dtype: if not None, the floating point type of the state of
+            every dimension: sampling scores, probability densities,
+            sampler tables and continuous grids (see
+            `VariableBase.setDtype`). numpy.float32 halves the memory and
+            the memory traffic of learning and sampling. Default: None,
+            i.e. the dimensions are used as they are
+        @param bank: if True, the dimensions are packed into a single
+            `DimensionBank` (`self.bank`), and `self.dimensions` holds
+            views of its rows. Sampling, batch and histogram learning and
+            renormalization then process all the dimensions in single
+            array operations. Requires `ContinuousVariable` dimensions
+            with equal sampling values and `samplingStd` (see
+            `DimensionBank.fromVariables`). Default: False
+        @param bankFile: if not None, the bank state is stored in this
+            file through `numpy.memmap`. Default: None, i.e. in memory
+        @param checkpointFile: if not None, `train` saves the optimizer
+            into this file (see `save`) every `checkpointEvery` learning
+            iterations. Default: None, i.e. no automatic checkpoints
+        @param checkpointEvery: the interval, in learning iterations, of
+            the automatic checkpoints. Default: 1
+        @param cacheSize: if positive, the optimizer keeps an
+            `EvaluationCache` of this capacity in `self.cache`. `train`
+            looks every sampled solution up in the cache and evaluates
+            only the solutions that are not cached, once each. Suits
+            deterministic objective functions over discrete dimensions.
+            Default: 0, i.e. no cache (`self.cache` is None)
+        @param deduplicate: if True, `train` evaluates every distinct
+            solution of a sample once, and learns the distinct solutions
+            weighted by their multiplicities (see the `weights` parameter
+            of `learn`). The distributions are updated as if every copy
+            was learned, while the evaluations and the kernel updates
+            drop with the share of duplicates. Default: False
+        @param instrumentation: None or False (default), True or an
+            `Instrumentation` object. If not None or False, the time of
+            every phase of the optimization (sampling, evaluation,
+            scaling, kernel updates, applying the scores, archive,
+            checkpoints) and the numbers of evaluations and of learned
+            solutions are recorded in
+            `self.instrumentation`, per iteration and cumulatively. Pass
+            an `Instrumentation` object to set a callback that receives
+            the record of every iteration. When disabled (default),
+            `self.instrumentation` is None
         '''
 
-        assert callable(func)
-        self.func = func #FIXME Add support for no func at all. In this
-            #case the "train" function will be disabled and the training
-            #will be done by doing obj.sample(N), evaluating the samples
-            #externally and then updating the hyperspace by the means of
-            #obj.learn(samples, values)
+        assert (func is None) or callable(func)
+        self.func = func
         self.dimensions = self._parseDimensionsArgument(dimensions)
         assert \
             len(map(id, self.dimensions)) ==\
             len(set(map(id, self.dimensions))), \
             "ASOP dimensions contain at least two variables that point to"\
             " the same object. You don't want that."
+        if dtype is not None:
+            self._setDimensionsDtype(dtype)
+        if bank:
+            self.bank = DimensionBank.fromVariables(self.dimensions, bankFile)
+            self.dimensions = self.bank.dimensions
+        else:
+            self.bank = None
         assert direction in (MINIMIZE, MAXIMIZE)
         self.direction = direction
         if (not scaling is None) and (scaling != 'auto'):
             assert callable(scaling)
         self.scaling = scaling
+        assert learning in LEARNING_MODES, \
+            'learning should be one of %s'%(', '.join(LEARNING_MODES))
+        self.learning = learning
+        assert (executor in (None, 'thread', 'process')) or \
+            hasattr(executor, 'map'), \
+            'executor should be None, "thread", "process" or have a map method'
+        self.executor = executor
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        assert workers > 0
+        self.workers = int(workers)
+        assert (chunksize is None) or (chunksize > 0)
+        self.chunksize = chunksize
+        self._pool = None
+        self.vectorized = vectorized
+        assert tellBatchSize > 0
+        self.tellBatchSize = tellBatchSize
+        self._nextId = 0
+        self._pending = {} #id -> solution of every asked, untold solution
+        self._toldSolutions = []
+        self._toldValues = []
+        #number of `learn` calls so far
+        self.iteration = 0
+        assert archiveSize >= 0
+        if archiveSize:
+            self.archive = EliteArchive(archiveSize, direction)
+        else:
+            self.archive = None
+        assert checkpointEvery > 0
+        self.checkpointFile = checkpointFile
+        self.checkpointEvery = int(checkpointEvery)
+        assert cacheSize >= 0
+        if cacheSize:
+            self.cache = EvaluationCache(cacheSize)
+        else:
+            self.cache = None
+        self.deduplicate = deduplicate
+        if instrumentation is True:
+            instrumentation = Instrumentation()
+        elif instrumentation is False:
+            instrumentation = None
+        assert (instrumentation is None) or \
+            isinstance(instrumentation, Instrumentation)
+        self.instrumentation = instrumentation
+
+    def __getstate__(self):
+        '''The objective function, the worker pool and an executor object
+        are not a part of the pickled state. See `load`. The dimensions
+        are packed, see `variableTypes.packVariables`'''
+        state = self.__dict__.copy()
+        state['func'] = None
+        state['_pool'] = None
+        if state['executor'] not in (None, 'thread', 'process'):
+            state['executor'] = None
+        state['dimensions'] = variableTypes.packVariables(self.dimensions)
+        return state
+
+    def __setstate__(self, state):
+        state['dimensions'] = variableTypes.unpackVariables(
+            state['dimensions'])
+        self.__dict__.update(state)
+
+    def save(self, filename):
+        '''Save the state of the optimizer into a checkpoint file
+
+        The checkpoint contains everything `learn`, `sample`, `ask` and
+        `tell` depend on: the state of every dimension (or of the bank),
+        the scaling function, the pending and the told solutions, the
+        archive and the state of numpy's global random number generator,
+        that the dimensions sample from. The arrays are stored in a raw
+        binary form, see `checkpoint`. The scores and the probability
+        densities of the dimensions are stored as stacked blocks (see
+        `variableTypes.packVariables`). The sampler tables are not stored:
+        they are rebuilt from the probability densities when the loaded
+        dimensions are first sampled. The file is replaced atomically,
+        so a crash during `save` leaves the previous checkpoint intact.
+        The objective function and executor objects are not saved.
+        @param filename: name of the checkpoint file
+        '''
+
+        checkpoint.save({'optimizer': self,
+                         'randomState': np.random.get_state()}, filename)
+
+    @staticmethod
+    def load(filename, func=None, executor=None, mmap=False,
+             restoreRandomState=True):
+        '''Load an optimizer saved by `save`
+
+        An optimizer that is loaded with the random state and continues
+        learning reproduces the values of the optimizer that was saved.
+        @param filename: name of the checkpoint file
+        @param func: the objective function. Required by `train`
+        @param executor: if not None, replaces the saved executor. An
+            executor object (as opposed to "thread" or "process") is not
+            saved and has to be passed again
+        @param mmap: if True, the arrays of the state are copy-on-write
+            views of the memory-mapped file (see `checkpoint.load`).
+            Default: False
+        @param restoreRandomState: if True (default), numpy's global
+            random number generator is set to the saved state
+        @return: ASOP object
+        '''
+
+        state = checkpoint.load(filename, mmap)
+        optimizer = state['optimizer']
+        if func is not None:
+            assert callable(func)
+            optimizer.func = func
+        if executor is not None:
+            optimizer.executor = executor
+        if restoreRandomState:
+            np.random.set_state(state['randomState'])
+        return optimizer
 
 
 
+    def _setDimensionsDtype(self, dtype):
+        '''Convert every dimension to `dtype`. Every distinct grid is
+        converted once, so that the dimensions that share a grid (see
+        `variableTypes.sharedGrid`) still share it'''
+
+        #id of the original grid -> (original grid, converted grid). The
+        #original is referenced so that its id is not reused
+        grids = {}
+        for d in self.dimensions:
+            source = d.x
+            if id(source) in grids:
+                d.setDtype(dtype, grids[id(source)][1])
+            else:
+                d.setDtype(dtype)
+                grids[id(source)] = (source, d.x)
+
     def _parseDimensionsArgument(self, dimensions):
         try:
             iter(dimensions)
@@ -56,6 +306,8 @@ class ASOP:
             #need to guess
             if dimensions is None:
                 #need to guess
+                assert self.func is not None, \
+                    'Dimensions cannot be guessed without objective function'
                 import inspect
                 nargs = len(inspect.getargspec(self.func).args)
             else:
@@ -76,41 +328,332 @@ class ASOP:
         ''' Perform `n` training iterations
         @param n: number of iterations
         @param nToReturn: maximum number of (solution, value) pairs to return
-        @return: list of best (solution, value) pairs seen by the function.
-            The returned solutions are selected according to value and to
-            self.direction (minimization or maximization)
+        @return: `Population` of the best `nToReturn` solutions of this
+            generation, the best one first. The solutions are selected
+            according to value and to self.direction (minimization or
+            maximization). Iterating over the population yields
+            (solution, value) pairs. With `deduplicate`, the population
+            holds distinct solutions only, and its `weights` are their
+            multiplicities
         '''
 
         assert nToReturn >= 0
+        return self._train(n).best(nToReturn)
+
+    def _train(self, n):
+        '''A training iteration of `n` solutions
+        @return: the `Population` of the iteration, unsorted'''
+
+        assert self.func is not None, \
+            'train requires an objective function. Use ask/tell instead'
+        if self.vectorized:
+            theSample = self._sampleArray(n, dtype=float)
+        else:
+            theSample = self.sample(n, asArray=True)
+        if self.deduplicate:
+            with self._phase('sample'):
+                (theSample, weights) = self._uniqueSolutions(theSample)
+        else:
+            weights = None
+        with self._phase('evaluate'):
+            if self.vectorized:
+                rows = theSample
+            else:
+                #the objective function receives one tuple per solution
+                rows = [tuple(r) for r in theSample.tolist()]
+            if self.cache is None:
+                theValues = self._evaluate(rows)
+            else:
+                theValues = self._evaluateWithCache(rows)
+
+        iteration = self.iteration
+        scaled = self._learn(theSample, theValues, weights)
+        if (self.checkpointFile is not None) and \
+                (self.iteration % self.checkpointEvery == 0):
+            with self._phase('checkpoint'):
+                self.save(self.checkpointFile)
+        self._endIteration(iteration)
+        return Population(theSample, theValues, scaled, iteration,
+                          self.direction, weights)
 
-        theSample = self.sample(n)
+    def optimize(self, n=100, maxIterations=1000, criteria=None,
+                 nToReturn=1):
+        '''Call `train(n)` until convergence
 
-        #if func accepts N arguments, map expects N iterables. theSample
-        #above is a single iterable, in which each element is N-tuple.
-        #Thus, need to transpose
-        theValues = map(self.func, theSample)
+        After every iteration, every criterion is updated with the
+        optimizer and the population of the iteration. The optimization
+        stops as soon as one of the criteria is met (combine criteria
+        with `convergence.AllOf` to require several of them), or after
+        `maxIterations` iterations.
+        @param n: number of solutions per iteration
+        @param maxIterations: maximal number of iterations
+        @param criteria: sequence of `convergence.ConvergenceCriterion`
+            objects. They are reset before the first iteration. Default:
+            `convergence.defaultCriteria()`
+        @param nToReturn: number of solutions to return
+        @return: tuple (population, criterion). `population` holds the
+            best `nToReturn` solutions of all the iterations, the best
+            one first. If the optimizer keeps an archive (see
+            `archiveSize`), they are taken from `self.archive`, i.e. they
+            include the solutions of the earlier calls, and they are at
+            most `archiveSize`. `criterion` is the criterion that was met,
+            or None if `maxIterations` were performed
+        '''
 
-        self.learn(theSample, theValues)
-        if nToReturn > 0:
-            ret = [(s, v) for (s, v) in zip(theSample, theValues)]
-            reverse = (self.direction == MAXIMIZE)
-            ret.sort(cmp=lambda a, b: cmp(a[1], b[1]), reverse=reverse)
-            ret = ret[0:nToReturn]
+        assert maxIterations > 0
+        assert nToReturn > 0
+        if criteria is None:
+            criteria = convergence.defaultCriteria()
+        for criterion in criteria:
+            criterion.reset()
+        if self.archive is None:
+            best = EliteArchive(nToReturn, self.direction)
         else:
-            ret = []
-        return ret
+            #learn already offers every solution to the archive
+            best = self.archive
+        for i in range(maxIterations): #@UnusedVariable
+            population = self._train(n)
+            if best is not self.archive:
+                best.update(population.solutions, population.values)
+            #every criterion is updated, so that the incremental ones do
+            #not miss iterations
+            met = [c for c in criteria if c.update(self, population)]
+            if met:
+                return (best.best(nToReturn), met[0])
+        return (best.best(nToReturn), None)
+
+    def trainConcurrently(self, n=1, nToReturn=0, concurrency=8):
+        '''Perform `n` evaluations, keeping up to `concurrency` of them
+        in flight at any moment
+
+        Suits I/O-bound objective functions (e.g. calls to a remote
+        service), that spend most of their time waiting. Unlike `train`,
+        there is no barrier at the end of the generation: every result is
+        passed to `tell` as soon as it arrives, and the next solution is
+        submitted to the freed worker thread. Hence, the results are
+        learned according to `tellBatchSize`.
+        @param n: number of evaluations
+        @param nToReturn: see `train`
+        @param concurrency: maximal number of simultaneous evaluations
+        @return: see `train`
+        '''
+
+        assert self.func is not None, \
+            'trainConcurrently requires an objective function'
+        assert nToReturn >= 0
+        assert concurrency > 0
+
+        (ids, solutions) = self.ask(n)
+        func = self.func
+        def evaluate((i, solution)):
+            return (i, func(solution))
+
+        if self.instrumentation is not None:
+            self.instrumentation.count('evaluations', n)
+        values = {}
+        pool = ThreadPool(min(concurrency, n))
+        try:
+            for (i, v) in pool.imap_unordered(evaluate, zip(ids, solutions)):
+                values[i] = v
+                self.tell([i], [v])
+        except:
+            for i in ids:
+                self._pending.pop(i, None)
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+        self.flush()
+        population = Population(solutions, [values[i] for i in ids],
+                                direction=self.direction)
+        return population.best(nToReturn)
+
+
+
+    def ask(self, n=1):
+        '''Draw n candidate solutions to be evaluated externally
+
+        @return: tuple (ids, solutions). `ids` is a list of n unique integers
+            that identify the solutions when their values are reported by
+            `tell`
+        '''
+
+        solutions = self.sample(n)
+        ids = range(self._nextId, self._nextId + n)
+        self._nextId += n
+        self._pending.update(zip(ids, solutions))
+        return (ids, solutions)
+
+    def tell(self, ids, values):
+        '''Report the objective function values of asked solutions
+
+        The results may be reported in any order and in batches of any size.
+        They are folded into the distributions as soon as at least
+        `tellBatchSize` results are waiting, without waiting for the rest
+        of the asked solutions. With "auto" scaling, the results are held
+        until values that are sufficient to create the scaling function
+        are reported.
+        @param ids: sequence of ids, as returned by `ask`
+        @param values: the values of the corresponding solutions
+        @return: True if the reported results were learned, False if they
+            are still waiting
+        '''
+
+        assert len(ids) == len(values)
+        assert len(set(ids)) == len(ids), 'Repeated solution ids'
+        unknown = [i for i in ids if i not in self._pending]
+        if unknown:
+            raise KeyError('Unknown or already told solution ids: %s'%
+                           ', '.join(str(i) for i in unknown[:10]))
+        for (i, v) in zip(ids, values):
+            self._toldSolutions.append(self._pending.pop(i))
+            self._toldValues.append(v)
+        if len(self._toldValues) < self.tellBatchSize:
+            return False
+        if (self.scaling == 'auto') and \
+                (len(set(self._toldValues)) < 2):
+            return False
+        self.flush()
+        return True
+
+    def flush(self):
+        '''Learn the told results that are still waiting, if any'''
+
+        if self._toldValues:
+            (solutions, values) = (self._toldSolutions, self._toldValues)
+            self._toldSolutions = []
+            self._toldValues = []
+            self.learn(solutions, values)
 
+    @property
+    def nPending(self):
+        '''Number of solutions that were asked but not told yet'''
+        return len(self._pending)
 
 
-    def learn(self, solutions, values):
+    def _evaluate(self, theSample):
+        '''Evaluate the objective function for every solution in
+        `theSample`. Keeps the order of the solutions'''
+
+        if self.instrumentation is not None:
+            self.instrumentation.count('evaluations', len(theSample))
+        if self.vectorized:
+            return self._evaluateVectorized(theSample)
+        if self.executor is None:
+            return map(self.func, theSample)
+        elif self.executor in ('thread', 'process'):
+            pool = self._getPool()
+            return pool.map(self.func, theSample,
+                            self._getChunksize(len(theSample)))
+        else:
+            return list(self.executor.map(self.func, theSample))
+
+    def _evaluateWithCache(self, theSample):
+        '''Evaluate the solutions of `theSample` that are not in
+        `self.cache`, once each, and cache their values. Keeps the order
+        of the solutions. A repeat of a missing solution within the batch
+        is not evaluated again, and is counted as a hit'''
+
+        if self.vectorized:
+            keys = [tuple(r) for r in theSample.tolist()]
+        else:
+            keys = theSample
+        cache = self.cache
+        theValues = np.empty(len(keys))
+        missing = {} #solution -> indices in theSample
+        firstIndices = []
+        for (i, key) in enumerate(keys):
+            if key in missing:
+                missing[key].append(i)
+                cache.hits += 1
+                continue
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                theValues[i] = value
+            else:
+                missing[key] = [i]
+                firstIndices.append(i)
+        if not firstIndices:
+            return theValues
+        if self.vectorized:
+            newValues = self._evaluate(theSample[firstIndices])
+        else:
+            newValues = self._evaluate([keys[i] for i in firstIndices])
+        for (i, value) in zip(firstIndices, newValues):
+            cache.put(keys[i], value)
+            theValues[missing[keys[i]]] = value
+        return theValues
+
+    def _evaluateVectorized(self, theSample):
+        if self.executor is None:
+            theValues = np.asarray(self.func(theSample), dtype=float)
+        else:
+            chunksize = self._getChunksize(len(theSample))
+            chunks = [theSample[i:i + chunksize]
+                      for i in range(0, len(theSample), chunksize)]
+            if self.executor in ('thread', 'process'):
+                results = self._getPool().map(self.func, chunks, 1)
+            else:
+                results = list(self.executor.map(self.func, chunks))
+            theValues = np.concatenate([np.asarray(r, dtype=float).ravel()
+                                        for r in results])
+        theValues = theValues.ravel()
+        assert len(theValues) == len(theSample), \
+            'Vectorized objective function should return one value per row'
+        return theValues
+
+    def _getChunksize(self, n):
+        chunksize = self.chunksize
+        if chunksize is None:
+            chunksize = max(1, -(-n // (4 * self.workers)))
+        return chunksize
+
+    def _getPool(self):
+        if self._pool is None:
+            if self.executor == 'thread':
+                self._pool = ThreadPool(self.workers)
+            else:
+                self._pool = multiprocessing.Pool(self.workers)
+        return self._pool
+
+    def close(self):
+        '''Release the worker pool created for the evaluation, if any.
+        A new pool will be created if `train` is called again'''
+
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+    def learn(self, solutions, values, weights=None):
         '''Update the hyper-space with the given solutions and function values
 
         Note that this function bypasses the object's objective function
+        @param weights: (optional) the multiplicity of every solution.
+            Learning a solution with weight k updates the distributions
+            as learning k copies of it. Default: None, i.e. all ones
+        @return: array of the scaled values (before the direction is
+            taken into account)
         '''
 
+        iteration = self.iteration
+        scaled = self._learn(solutions, values, weights)
+        self._endIteration(iteration)
+        return scaled
+
+    def _learn(self, solutions, values, weights=None):
+        '''`learn`, without closing the iteration of the instrumentation.
+        `train` closes it after the checkpoint'''
+
         assert len(solutions) == len(values)
-        if self.scaling:
-            if self.scaling == 'auto':
+        if weights is not None:
+            weights = np.asarray(weights, dtype=float).ravel()
+            assert len(weights) == len(values)
+        if self.scaling == 'auto':
+            with self._phase('scaling'):
                 try:
                     self.scaling = scaling.tanhScalingFromValueExtrema(values,
                                                                        0.8)
@@ -119,36 +662,221 @@ class ASOP:
                     ' specified values'
                     print msg
                     raise
-            scaled = map(self.scaling, values)
+
+        if self.learning == 'sequential':
+            scaled = self._learnSequentially(solutions, values, weights)
         else:
-            scaled = values
+            scaled = self._learnInBatch(solutions, values, weights)
+        #note the delayed apply in both modes. Need to explicitly apply
+        #the score
+        with self._phase('apply'):
+            if self.bank is not None:
+                self.bank.applySamplingScore()
+            else:
+                for dimension in self.dimensions:
+                    dimension.applySamplingScore()
+        if self.archive is not None:
+            with self._phase('archive'):
+                #train, tell and the vectorized mode learn different
+                #layouts. The archive keeps that of `sample`
+                self.archive.update(self._asSampleArray(solutions), values)
+        self.iteration += 1
+        if self.instrumentation is not None:
+            self.instrumentation.count('learned', len(solutions))
+        return scaled
 
-        scaled = map(lambda x: self.direction * x, scaled)
+    def _endIteration(self, iteration):
+        if self.instrumentation is not None:
+            self.instrumentation.endIteration(iteration)
 
-        for solution, value in zip(solutions, scaled):
-            for x, dimension in zip(solution, self.dimensions):
-                dimension.alterSamplingDistribution(value, x,
-                                                    dimension.samplingStd,
-                                                    immediateApply=False)
-        #note the delayed apply above. Need to explicitly apply the score
-        for dimension in self.dimensions:
-            dimension.applySamplingScore()
+    def _phase(self, name):
+        '''Timer of the phase `name` (see `instrumentation.PHASES`), a
+        context manager that does nothing if the instrumentation is
+        disabled'''
+        if self.instrumentation is None:
+            return NULL_PHASE
+        return self.instrumentation.phase(name)
 
 
+    def _learnSequentially(self, solutions, values, weights=None):
+        with self._phase('scaling'):
+            if self.scaling:
+                scaled = map(self.scaling, values)
+            else:
+                scaled = values
+            ret = np.asarray(scaled, dtype=float)
 
+            scaled = map(lambda x: self.direction * x, scaled)
+            if weights is not None:
+                scaled = [x * w for (x, w) in zip(scaled, weights)]
 
+        with self._phase('update'):
+            for solution, value in zip(solutions, scaled):
+                for x, dimension in zip(solution, self.dimensions):
+                    dimension.alterSamplingDistribution(value, x,
+                                                        dimension.samplingStd,
+                                                        immediateApply=False)
+        return ret
 
 
-    def sample(self, n=1):
-        '''Draw n samples from the hyperspace'''
+    def _learnInBatch(self, solutions, values, weights=None):
+        values = np.asarray(values, dtype=float)
+        with self._phase('scaling'):
+            if self.scaling:
+                try:
+                    scaled = np.asarray(self.scaling(values), dtype=float)
+                except (TypeError, ValueError):
+                    scaled = None
+                if (scaled is None) or (scaled.shape != values.shape):
+                    #the scaling function does not handle arrays
+                    scaled = np.array(map(self.scaling, values), dtype=float)
+            else:
+                scaled = values
+            amounts = scaled * self.direction
+            if weights is not None:
+                amounts = amounts * weights
 
+        if len(solutions) == 0:
+            return scaled
+        if self.learning == 'histogram':
+            method = 'histogram'
+        else:
+            method = 'kernel'
+        with self._phase('update'):
+            columns = self._solutionColumns(solutions)
+            assert len(columns) == len(self.dimensions)
+            if self.bank is not None:
+                self.bank.alterSamplingDistributionBatch(
+                    amounts, np.asarray(columns, dtype=float),
+                    self.bank.samplingStd, immediateApply=False,
+                    method=method)
+                return scaled
+            for locations, dimension in zip(columns, self.dimensions):
+                dimension.alterSamplingDistributionBatch(
+                    amounts, locations, dimension.samplingStd,
+                    immediateApply=False, method=method)
+        return scaled
+
+
+
+
+
+
+    @staticmethod
+    def _uniqueSolutions(theSample):
+        '''Distinct rows of a 2-D or a structured array, in the order of
+        their first occurrence, and their multiplicities
+
+        The rows are compared as raw bytes. Before that, the floating
+        point values are normalized: -0.0 becomes 0.0, and all the NaNs
+        get the same bit pattern. Thus, equal values are equal in both
+        kinds of arrays, and NaNs at the same positions are considered
+        equal'''
+
+        keys = np.array(theSample) #a copy, normalized in place
+        for name in (keys.dtype.names or [None]):
+            column = keys if name is None else keys[name]
+            if column.dtype.kind in 'fc':
+                column += 0 #-0.0 + 0 is 0.0
+                column[np.isnan(column)] = np.nan
+        #every row as a single opaque item, so that np.unique compares
+        #whole rows
+        if keys.dtype.names is None:
+            rowType = np.dtype((np.void, keys.strides[0]))
+        else:
+            rowType = np.dtype((np.void, keys.dtype.itemsize))
+        keys = keys.view(rowType).ravel()
+        (first, inverse) = np.unique(keys, return_index=True,
+                                     return_inverse=True)[1:]
+        counts = np.bincount(inverse)
+        order = np.argsort(first)
+        return (theSample[first[order]], counts[order])
+
+    @staticmethod
+    def _solutionColumns(solutions):
+        '''Split solutions to per-dimension columns. `solutions` may be a
+        sequence of tuples, a 2-D array or a structured array'''
+
+        if isinstance(solutions, np.ndarray):
+            if solutions.dtype.names is not None:
+                return [solutions[name] for name in solutions.dtype.names]
+            return solutions.T
+        return zip(*solutions)
+
+    def sample(self, n=1, asArray=False):
+        '''Draw n samples from the hyperspace
+
+        @param n: number of samples
+        @param asArray: if False (default), return a list of n D-tuples.
+            If True, return an array with one row per sample, filled
+            column by column, without creating any tuples. If all the
+            dimensions produce values of the same type, the array is an
+            (n, D) array of that type. Otherwise (e.g. when `IntegerVariable`
+            and `ContinuousVariable` dimensions are mixed), it is a
+            structured array of n records with one field per dimension.
+            The fields are named after the dimensions, or "X0", "X1", ...
+            if the names are not unique. `learn` accepts both forms.
+        '''
+
+        if asArray:
+            return self._sampleArray(n)
         assert n > 0
-        components = []
-        for d in self.dimensions:
-            values = d.random(n)
-            components.append(values)
-        #matrix transpose magic http://stackoverflow.com/a/4937526/17523
-        ret = zip(*components)
+        with self._phase('sample'):
+            if self.bank is not None:
+                components = self.bank.random(n).T
+            else:
+                components = [d.random(n) for d in self.dimensions]
+            #matrix transpose magic http://stackoverflow.com/a/4937526/17523
+            ret = zip(*components)
         return ret
 
+    def _sampleArray(self, n, dtype=None):
+        '''Draw n samples from the hyperspace into an array
+
+        @param dtype: the type of the (n, D) array. If None, the type is
+            derived from the dimensions, as described in `sample`
+        '''
+
+        assert n > 0
+        with self._phase('sample'):
+            if dtype is None:
+                dtypes = self._dimensionDtypes()
+                if len(set(dtypes)) > 1:
+                    ret = np.empty(n, dtype=self._structuredDtype(dtypes))
+                    for (name, d) in zip(ret.dtype.names, self.dimensions):
+                        ret[name] = d.random(n)
+                    return ret
+                dtype = dtypes[0]
+            if self.bank is not None:
+                return np.asarray(self.bank.random(n), dtype=dtype)
+            ret = np.empty((n, len(self.dimensions)), dtype=dtype)
+            for (i, d) in enumerate(self.dimensions):
+                ret[:, i] = d.random(n)
+            return ret
+
+    def _dimensionDtypes(self):
+        return [np.asarray(d.x[:1]).dtype for d in self.dimensions]
+
+    def _asSampleArray(self, solutions):
+        '''`solutions` (see `learn`) in the layout of
+        `sample(n, asArray=True)`. Arrays that already have this layout
+        are returned as they are'''
+
+        dtypes = self._dimensionDtypes()
+        if len(set(dtypes)) == 1:
+            return np.asarray(solutions, dtype=dtypes[0]).reshape(
+                len(solutions), len(self.dimensions))
+        dtype = self._structuredDtype(dtypes)
+        if isinstance(solutions, np.ndarray) and (solutions.dtype == dtype):
+            return solutions
+        ret = np.empty(len(solutions), dtype=dtype)
+        for (name, column) in zip(dtype.names,
+                                  self._solutionColumns(solutions)):
+            ret[name] = column
+        return ret
 
+    def _structuredDtype(self, dtypes):
+        names = [d.name for d in self.dimensions]
+        if (len(set(names)) != len(names)) or (not all(names)):
+            names = ['X%d'%i for i in range(len(self.dimensions))]
+        return np.dtype(zip([str(nm) for nm in names], dtypes))
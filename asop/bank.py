@@ -0,0 +1,448 @@
+'''
+A bank of continuous dimensions that share one grid
+
+`DimensionBank` stores the state of D continuous dimensions over a common
+grid of G sampling values as (D, G) arrays: the scores, the probability
+densities and the cumulative distributions. Sampling all the dimensions,
+updating all of them and renormalizing are array operations over the
+whole block instead of D calls. The block may be backed by a file
+(`numpy.memmap`) for problems that do not fit in memory.
+
+The dimensions are exposed as `BankedVariable` objects, views of single
+rows of the bank that behave like `ContinuousVariable`.
+'''
+import numpy as np
+
+from variableTypes import ContinuousVariable, sharedGrid, readOnlyView, \
+    gaussianKernel, inverseLogit, asciiXYplot
+
+
+PROBABILITY_CALCULATION_STRATEGIES = ('RAW', 'CENTERED', 'STANDARDIZED')
+
+
+class DimensionBank(object):
+    '''Continuous dimensions over a common grid, stored as 2-D arrays
+
+    Row i of every array belongs to dimension i. The updates and the
+    sampling follow `ContinuousVariable` without kernel truncation, so
+    that a bank and the equivalent list of variables learn the same
+    distributions.
+    '''
+
+    #maximal number of kernel values that a kernel update evaluates at once.
+    #Limits the memory of the (locations x dimensions x grid) intermediate
+    #array
+    BATCH_CHUNK_SIZE = 2 ** 20
+
+    def __init__(self, grid, nDimensions, samplingStd=None, names=None,
+                 dtype=float, filename=None,
+                 probabilityCalculationStrategy='STANDARDIZED'):
+        '''
+        @param grid: sorted sampling values, common to all the dimensions.
+            At least two values are required
+        @param nDimensions: number of dimensions
+        @param samplingStd: standard deviation of sampling, common to all
+            the dimensions. If None (default), a quarter of the grid range,
+            as in `VariableBase`
+        @param names: (optional) sequence of dimension names
+        @param dtype: floating point type of the grid, the scores and the
+            densities. Default: float. The cumulative distributions are
+            always double precision, see `random`
+        @param filename: if not None, all the (D, G) arrays are stored in
+            this file through `numpy.memmap`. The file is created, or
+            overwritten if it exists. Default: None, i.e. in memory
+        @param probabilityCalculationStrategy: see `VariableBase`
+        '''
+
+        grid = ContinuousVariable.parseSamplingValuesArgument(grid)
+        self.dtype = np.dtype(dtype)
+        self.grid = sharedGrid(grid, self.dtype)
+        assert len(self.grid) > 1, \
+            'A bank requires at least two sampling values'
+        assert nDimensions > 0
+        self.nDimensions = nDimensions
+        if samplingStd is None:
+            samplingStd = (self.grid[-1] - self.grid[0]) / 4.0
+        self.samplingStd = samplingStd
+        if probabilityCalculationStrategy not in \
+                PROBABILITY_CALCULATION_STRATEGIES:
+            raise ValueError('_probabilityCalculationStrategy parameter has '
+                             'an illegal value of "%s"'%
+                             probabilityCalculationStrategy)
+        self._probabilityCalculationStrategy = probabilityCalculationStrategy
+        self.filename = filename
+        self._buffer = None
+
+        self._dx = np.diff(self.grid.astype(float))
+        steps = np.diff(self.grid)
+        if np.allclose(steps, steps[0], rtol=1e-9, atol=0):
+            self._gridStep = (self.grid[-1] - self.grid[0]) / \
+                (len(self.grid) - 1.0)
+        else:
+            self._gridStep = None
+
+        (self._cdf, self._scores, self._pdf, self._workScores,
+         self._workProbability) = self._allocate(filename)
+        self._scores.fill(0.0)
+        self._pdf.fill(1.0 / len(self.grid))
+        self._buildCdf(slice(0, nDimensions))
+
+        if names is None:
+            names = [''] * nDimensions
+        assert len(names) == nDimensions
+        self.dimensions = [BankedVariable(self, i, name)
+                           for (i, name) in enumerate(names)]
+
+    @classmethod
+    def fromVariables(cls, variables, filename=None):
+        '''Create a bank with the state of the given variables
+
+        @param variables: sequence of `ContinuousVariable` objects with
+            equal sampling values, `samplingStd`, dtype and probability
+            calculation strategy, without grid refinement and without
+            kernel truncation
+        @param filename: see `__init__`
+        @raise ValueError: if the variables cannot share a bank
+        '''
+
+        variables = list(variables)
+        assert len(variables) > 0
+        first = variables[0]
+        for v in variables:
+            if type(v) is not ContinuousVariable:
+                raise ValueError('Only ContinuousVariable objects can be '
+                                 'banked, got %r'%v)
+            if (len(v.x) != len(first.x)) or np.any(v.x != first.x):
+                raise ValueError('Banked variables should have the same '
+                                 'sampling values')
+            if (v.samplingStd != first.samplingStd) or \
+                    (v.dtype != first.dtype) or \
+                    (v._probabilityCalculationStrategy !=
+                     first._probabilityCalculationStrategy):
+                raise ValueError('Banked variables should have the same '
+                                 'samplingStd, dtype and probability '
+                                 'calculation strategy')
+            if v.refineEvery is not None:
+                raise ValueError('Variables with grid refinement cannot be '
+                                 'banked')
+            if v.kernelTruncation is not None:
+                raise ValueError('Variables with kernel truncation cannot be '
+                                 'banked')
+        bank = cls(first.x, len(variables), first.samplingStd,
+                   [v.name for v in variables], first.dtype, filename,
+                   first._probabilityCalculationStrategy)
+        for (i, v) in enumerate(variables):
+            bank._scores[i] = v.scores
+            bank._pdf[i] = v.pdfValues
+        bank._buildCdf(slice(0, len(variables)))
+        return bank
+
+    def _allocate(self, filename):
+        '''The (D, G) arrays: cdf (double precision) followed by scores,
+        pdf and the two work arrays (self.dtype)'''
+        shape = (self.nDimensions, len(self.grid))
+        dtypes = [np.dtype(float)] + [self.dtype] * 4
+        if filename is None:
+            return [np.zeros(shape, dtype=dt) for dt in dtypes]
+        sizes = [shape[0] * shape[1] * dt.itemsize for dt in dtypes]
+        buf = np.memmap(filename, dtype=np.uint8, mode='w+',
+                        shape=(sum(sizes),))
+        self._buffer = buf
+        ret = []
+        offset = 0
+        #the double precision array comes first, so that every array is
+        #aligned
+        for (dt, size) in zip(dtypes, sizes):
+            ret.append(buf[offset:offset + size].view(dt).reshape(shape))
+            offset += size
+        return ret
+
+    def __getstate__(self):
+        '''A pickled bank is held in memory: neither the file nor the work
+        arrays are a part of the state'''
+        state = self.__dict__.copy()
+        state['filename'] = None
+        state['_buffer'] = None
+        del state['_workScores']
+        del state['_workProbability']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._workScores = np.empty(self._scores.shape, dtype=self.dtype)
+        self._workProbability = np.empty(self._scores.shape, dtype=self.dtype)
+
+    def flush(self):
+        '''Write the state to the file, if the bank is file-backed'''
+        if self._buffer is not None:
+            self._buffer.flush()
+
+    def _rows(self, rows):
+        if rows is None:
+            return slice(0, self.nDimensions)
+        return rows
+
+    def random(self, times, rows=None):
+        '''Sample every dimension `times` times
+
+        The cumulative distribution of row i is stored shifted by i, so
+        that the (D, G) block is one sorted array: the uniform numbers of
+        all the dimensions are shifted the same way and located by a single
+        search. Within an interval, the cumulative distribution is
+        interpolated linearly, as in `sampling.ContinuousSampler`.
+        @param times: number of samples
+        @param rows: (optional) slice of the dimensions to sample.
+            Default: all
+        @return: (times, number of dimensions) float array
+        '''
+
+        rows = self._rows(rows)
+        index = np.arange(rows.start, rows.stop)
+        v = np.random.random_sample((times, len(index)))
+        v += index
+        flat = self._cdf.ravel()
+        G = len(self.grid)
+        interval = np.searchsorted(flat, v, 'right')
+        interval -= 1
+        first = index * G
+        np.clip(interval, first, first + G - 2, out=interval)
+        lo = flat[interval]
+        mass = flat[interval + 1]
+        mass -= lo
+        interval -= first
+        v -= lo
+        with np.errstate(divide='ignore', invalid='ignore'):
+            v *= np.where(mass > 0, self._dx[interval] / mass, 0.0)
+        v += self.grid[interval]
+        return v
+
+    def alterSamplingDistributionBatch(self, amounts, locations, width=None,
+                                       immediateApply=True, method='kernel',
+                                       rows=None):
+        '''Update the distributions of all the dimensions at once
+
+        @param amounts: sequence of N update amounts, common to all the
+            dimensions
+        @param locations: (number of dimensions, N) array. Row i holds the
+            update locations of dimension i
+        @param width: how wide should every update be. Default:
+            `samplingStd`
+        @param immediateApply: see `VariableBase.alterSamplingDistribution`
+        @param method: "kernel" or "histogram", see
+            `VariableBase.alterSamplingDistributionBatch`. The histograms
+            of all the rows are convolved with the kernel by FFT along the
+            rows. For unequally spaced grids, the kernels of all the bins
+            are summed instead
+        @param rows: (optional) slice of the dimensions to update.
+            Default: all
+        '''
+
+        rows = self._rows(rows)
+        if width is None:
+            width = self.samplingStd
+        assert width >= 0
+        amounts = np.asarray(amounts, dtype=float)
+        locations = np.asarray(locations, dtype=float)
+        assert locations.shape == (rows.stop - rows.start, len(amounts))
+        if method == 'kernel' or (method == 'histogram' and width == 0):
+            total = self._kernelSum(amounts, locations, width)
+        elif method == 'histogram':
+            hist = self._weightedHistogram(amounts, locations)
+            if self._gridStep is None:
+                total = self._binnedKernelSum(hist, width)
+            else:
+                total = self._convolveWithKernel(hist, width)
+        else:
+            raise ValueError('Unknown update method "%s"'%method)
+        self._scores[rows] += total
+        if immediateApply:
+            self.applySamplingScore(rows)
+
+    def _kernelSum(self, amounts, locations, width):
+        (R, N) = locations.shape
+        G = len(self.grid)
+        total = np.zeros((R, G), dtype=self.dtype)
+        amounts = amounts.astype(self.dtype)
+        #blocks of (chunk, rowChunk, G) kernel values. A block holds at
+        #least one kernel (G values)
+        rowChunk = max(1, min(R, self.BATCH_CHUNK_SIZE // G))
+        chunk = max(1, self.BATCH_CHUNK_SIZE // (rowChunk * G))
+        for row in range(0, R, rowChunk):
+            rowEnd = row + rowChunk
+            for start in range(0, N, chunk):
+                kernels = gaussianKernel(
+                    self.grid, locations[row:rowEnd, start:start + chunk].T,
+                    width, self.dtype)
+                total[row:rowEnd] += np.tensordot(
+                    amounts[start:start + chunk], kernels, axes=(0, 0))
+        return total
+
+    def _weightedHistogram(self, amounts, locations):
+        '''Linear binning of every row, see
+        `QuantitativeVariableBase._updateInternalSamplingScoreHistogram`.
+        All the rows are binned by a single bincount'''
+        x = self.grid
+        (R, N) = locations.shape
+        G = len(x)
+        right = np.searchsorted(x, locations, 'right')
+        np.clip(right, 1, G - 1, out=right)
+        left = right - 1
+        fraction = (locations - x[left]) / (x[right] - x[left])
+        np.clip(fraction, 0.0, 1.0, out=fraction)
+        rowOffset = (np.arange(R) * G)[:, np.newaxis]
+        left += rowOffset
+        right += rowOffset
+        hist = np.bincount(right.ravel(), weights=(amounts * fraction).ravel(),
+                           minlength=R * G)
+        fraction = 1.0 - fraction
+        fraction *= amounts
+        hist += np.bincount(left.ravel(), weights=fraction.ravel(),
+                            minlength=R * G)
+        return hist.reshape(R, G)
+
+    def _binnedKernelSum(self, hist, width):
+        '''Sum of the kernels centered at the sampling values, weighted by
+        the (R, G) histogram'''
+        x = self.grid
+        G = len(x)
+        total = np.zeros(hist.shape)
+        chunk = max(1, self.BATCH_CHUNK_SIZE // G)
+        for start in range(0, G, chunk):
+            kernels = gaussianKernel(x, x[start:start + chunk], width)
+            total += np.dot(hist[:, start:start + chunk], kernels)
+        return total
+
+    def _convolveWithKernel(self, hist, width):
+        G = hist.shape[1]
+        offsets = np.arange(-(G - 1), G) * self._gridStep
+        kernel = gaussianKernel(offsets, [0.0], width)[0]
+        n = 1
+        while n < G + len(kernel) - 1:
+            n *= 2
+        total = np.fft.irfft(np.fft.rfft(hist, n, axis=1) *
+                             np.fft.rfft(kernel, n), n, axis=1)
+        return total[:, G - 1:2 * G - 1]
+
+    def applySamplingScore(self, rows=None):
+        '''Synchronize the densities with the scores, see
+        `VariableBase.applySamplingScore`. Every step processes all the
+        rows at once, in the work arrays of the bank'''
+
+        rows = self._rows(rows)
+        scores = self._workScores[rows]
+        np.copyto(scores, self._scores[rows])
+        strategy = self._probabilityCalculationStrategy
+        if strategy != 'RAW':
+            scores -= np.mean(scores, axis=1)[:, np.newaxis]
+            if strategy == 'STANDARDIZED':
+                std = np.sqrt(np.einsum('ij,ij->i', scores, scores) /
+                              scores.shape[1])
+                std[std == 0] = 1.0
+                scores /= std[:, np.newaxis]
+        p = inverseLogit(scores, out=self._workProbability[rows],
+                         overwriteInput=True)
+        self._normalizeRows(p)
+        pdf = self._pdf[rows]
+        pdf *= p
+        self._normalizeRows(pdf)
+        self._scores[rows] = 0.0
+        self._buildCdf(rows)
+
+    @staticmethod
+    def _normalizeRows(a):
+        '''Normalize every row to unit sum, in place. Rows whose values are
+        all zero become uniform'''
+        totals = np.sum(a, axis=1)
+        empty = totals <= 0
+        if np.any(empty):
+            a[empty] = 1.0
+            totals[empty] = a.shape[1]
+        a /= totals[:, np.newaxis]
+
+    def _buildCdf(self, rows):
+        '''Cumulative distribution of every row by the trapezoidal rule,
+        normalized to [0, 1] and shifted by the row index'''
+        cdf = self._cdf[rows]
+        pdf = self._pdf[rows]
+        cdf[:, 0] = 0.0
+        np.add(pdf[:, :-1], pdf[:, 1:], out=cdf[:, 1:])
+        cdf[:, 1:] *= self._dx
+        np.cumsum(cdf[:, 1:], axis=1, out=cdf[:, 1:])
+        total = cdf[:, -1].copy()
+        cdf /= total[:, np.newaxis]
+        cdf += np.arange(rows.start, rows.stop)[:, np.newaxis]
+
+
+class BankedVariable(object):
+    '''A single dimension of a `DimensionBank`
+
+    Supports the interface of `ContinuousVariable` that ASOP uses. The
+    arrays it returns are read-only views of the bank's row.
+    '''
+    __slots__ = ('bank', 'index', 'name')
+
+    def __init__(self, bank, index, name=None):
+        self.bank = bank
+        self.index = index
+        if name is None:
+            name = ''
+        self.name = name
+
+    def _rows(self):
+        return slice(self.index, self.index + 1)
+
+    @property
+    def x(self):
+        return self.bank.grid
+
+    @property
+    def pdfValues(self):
+        return readOnlyView(self.bank._pdf[self.index])
+
+    @property
+    def scores(self):
+        return readOnlyView(self.bank._scores[self.index])
+
+    @property
+    def samplingStd(self):
+        return self.bank.samplingStd
+
+    @property
+    def dtype(self):
+        return self.bank.dtype
+
+    def random(self, times=None):
+        '''See `VariableBase.random`'''
+        n = 1 if times is None else times
+        ret = self.bank.random(n, self._rows())[:, 0]
+        if times is None:
+            return ret[0]
+        return ret
+
+    rand = random #alias
+
+    def alterSamplingDistribution(self, amount, location, width,
+                                  immediateApply=True):
+        '''See `VariableBase.alterSamplingDistribution`'''
+        self.bank.alterSamplingDistributionBatch([amount], [[location]], width,
+                                                 immediateApply, 'kernel',
+                                                 self._rows())
+
+    def alterSamplingDistributionBatch(self, amounts, locations, width,
+                                       immediateApply=True, method='kernel'):
+        '''See `VariableBase.alterSamplingDistributionBatch`'''
+        locations = np.asarray(locations, dtype=float)[np.newaxis, :]
+        self.bank.alterSamplingDistributionBatch(amounts, locations, width,
+                                                 immediateApply, method,
+                                                 self._rows())
+
+    def applySamplingScore(self):
+        '''See `VariableBase.applySamplingScore`'''
+        self.bank.applySamplingScore(self._rows())
+
+    def __repr__(self):
+        return '<%s> "%s"'%(self.__class__.__name__, self.name)
+
+    def strAsciiPlot(self):
+        '''Return a string with ASCII representation of the variable'''
+        return asciiXYplot(self.x, self.pdfValues, self.name)
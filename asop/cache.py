@@ -0,0 +1,80 @@
+'''
+Bounded cache of objective function values
+'''
+from collections import OrderedDict
+
+
+class EvaluationCache(object):
+    '''Least recently used (LRU) cache of the values of evaluated solutions
+
+    Suits deterministic objective functions over discrete dimensions
+    (e.g. `IntegerVariable`), whose samples repeat more and more often as
+    the distributions sharpen. The solutions are the keys and have to be
+    hashable (e.g. tuples). Once `capacity` solutions are cached, storing
+    a new one evicts the solution that was looked up or stored the
+    longest time ago.
+
+    Attributes:
+    hits: number of lookups that found a value
+    misses: number of lookups that did not
+    '''
+
+    def __init__(self, capacity):
+        '''
+        @param capacity: maximal number of cached solutions
+        '''
+
+        assert capacity > 0
+        self.capacity = int(capacity)
+        self._values = OrderedDict() #the least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, solution):
+        '''Membership test. Neither counted nor considered a use'''
+        return solution in self._values
+
+    def __repr__(self):
+        return '<%s> %d of %d, %d hits, %d misses'%(
+            self.__class__.__name__, len(self), self.capacity, self.hits,
+            self.misses)
+
+    def get(self, solution, default=None):
+        '''The cached value of `solution`, or `default` if it is not cached.
+        A found solution becomes the most recently used one'''
+
+        try:
+            value = self._values.pop(solution)
+        except KeyError:
+            self.misses += 1
+            return default
+        self._values[solution] = value
+        self.hits += 1
+        return value
+
+    def put(self, solution, value):
+        '''Store the value of `solution`, evicting the least recently used
+        solutions if the capacity is exceeded'''
+
+        self._values.pop(solution, None)
+        self._values[solution] = value
+        while len(self._values) > self.capacity:
+            self._values.popitem(last=False)
+
+    @property
+    def hitRate(self):
+        '''Share of the lookups that found a value, None before the first
+        lookup'''
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return None
+        return float(self.hits) / lookups
+
+    def clear(self):
+        '''Remove all the cached values and reset the counters'''
+        self._values.clear()
+        self.hits = 0
+        self.misses = 0
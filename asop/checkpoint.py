@@ -0,0 +1,153 @@
+'''
+Compact binary checkpoints of picklable objects that hold numpy arrays
+
+A checkpoint file consists of a fixed header, a pickle of the object and
+the raw data of its arrays:
+
+    MAGIC | version (uint64) | pickle length (uint64) | pickle | padding |
+    array data
+
+Every numpy array of the object (with the exception of empty and object
+arrays) is replaced in the pickle by a reference (offset, dtype, shape,
+writeable flag), and its bytes are written to the data section, aligned to
+`ALIGNMENT` bytes. Saving is thus a sequence of raw writes instead of a
+per-element serialization. An array that the object references several
+times is written once and is restored as a single array, so that the
+identity checks of the loaded object (e.g. shared grids) still hold.
+
+On load, the data section is either read into memory in one call, or
+mapped (copy-on-write) with `numpy.memmap`. In both cases the arrays are
+views of a single buffer. Mapping skips the read, and lets the operating
+system page in only the data that is actually used. The remaining cost
+of loading is unpickling the object graph, so objects that hold many
+small arrays should pickle them stacked (see
+`variableTypes.packVariables`).
+'''
+import cPickle
+from cStringIO import StringIO
+import os
+import struct
+
+import numpy as np
+
+MAGIC = 'ASOPCKPT'
+VERSION = 1
+ALIGNMENT = 64
+_HEADER = struct.Struct('<8sQQ')
+
+
+def _padding(position):
+    return -position % ALIGNMENT
+
+
+class _ArrayCollector(object):
+    '''`persistent_id` of the pickler. Collects the arrays and assigns the
+    offsets of their data'''
+
+    def __init__(self):
+        self.arrays = []
+        self.size = 0
+        self._references = {}
+
+    def __call__(self, obj):
+        if (not isinstance(obj, np.ndarray)) or (obj.size == 0) or \
+                obj.dtype.hasobject:
+            return None
+        key = id(obj)
+        if key in self._references:
+            return self._references[key]
+        self.size += _padding(self.size)
+        reference = (self.size, obj.dtype.str, obj.shape,
+                     bool(obj.flags.writeable))
+        if obj.dtype.names is not None:
+            reference = reference + (obj.dtype.descr, )
+        self._references[key] = reference
+        #keeping the array alive keeps its id unique during the pickling
+        self.arrays.append(obj)
+        self.size += obj.nbytes
+        return reference
+
+
+def save(obj, filename):
+    '''Save `obj` into a checkpoint file
+
+    The file is first written under a temporary name and is then renamed,
+    so that an interrupted save never destroys an existing checkpoint.
+    @param obj: the object. Has to be picklable (pickle protocol 2)
+    @param filename: name of the checkpoint file
+    '''
+
+    collector = _ArrayCollector()
+    stream = StringIO()
+    pickler = cPickle.Pickler(stream, cPickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = collector
+    pickler.dump(obj)
+    pickled = stream.getvalue()
+
+    temporary = filename + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(pickled)))
+        f.write(pickled)
+        f.write('\0' * _padding(_HEADER.size + len(pickled)))
+        position = 0
+        for a in collector.arrays:
+            f.write('\0' * _padding(position))
+            position += _padding(position)
+            #tofile writes the data in C order, whatever the memory layout
+            a.tofile(f)
+            position += a.nbytes
+        f.flush()
+        os.fsync(f.fileno())
+    if os.name == 'nt' and os.path.exists(filename):
+        os.remove(filename)
+    os.rename(temporary, filename)
+
+
+def load(filename, mmap=False):
+    '''Load an object saved by `save`
+
+    @param filename: name of the checkpoint file
+    @param mmap: if True, the arrays are copy-on-write views of the
+        memory-mapped file: they can be modified, but the changes are not
+        written to the file. Default: False, i.e. the data section is read
+        into memory
+    @return: the object
+    '''
+
+    with open(filename, 'rb') as f:
+        (magic, version, length) = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError('%s is not a checkpoint file'%filename)
+        if version != VERSION:
+            raise ValueError('Unsupported checkpoint version %d'%version)
+        pickled = f.read(length)
+        dataStart = _HEADER.size + length
+        dataStart += _padding(dataStart)
+        if mmap:
+            size = os.fstat(f.fileno()).st_size - dataStart
+            if size > 0:
+                data = np.asarray(np.memmap(f, dtype=np.uint8, mode='c',
+                                            offset=dataStart,
+                                            shape=(size, )))
+            else:
+                data = np.empty(0, dtype=np.uint8)
+        else:
+            f.seek(dataStart)
+            data = np.fromfile(f, dtype=np.uint8)
+
+    arrays = {}
+    def persistent_load(reference):
+        key = reference[0]
+        if key not in arrays:
+            (offset, dtype, shape, writeable) = reference[:4]
+            dtype = np.dtype(reference[-1] if len(reference) > 4 else dtype)
+            nbytes = int(np.prod(shape)) * dtype.itemsize
+            a = data[offset:offset + nbytes].view(dtype).reshape(shape)
+            a.flags.writeable = writeable
+            arrays[key] = a
+        return arrays[key]
+
+    unpickler = cPickle.Unpickler(StringIO(pickled))
+    unpickler.persistent_load = persistent_load
+    return unpickler.load()
+
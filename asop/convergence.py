@@ -0,0 +1,195 @@
+'''
+Convergence criteria for `ASOP.optimize`
+
+A criterion is updated once per iteration, after `ASOP.train`, with the
+optimizer and the population of the iteration, and tells whether the
+optimization has converged. The criteria keep their state between the
+iterations (e.g. the best value so far), so that every update costs
+O(n) for the population based criteria and O(D * G) for the
+distribution based ones (D dimensions of G sampling values each), which
+is less than the `applySamplingScore` calls of a single iteration.
+'''
+from abc import ABCMeta, abstractmethod
+
+import numpy as np
+
+
+class ConvergenceCriterion(object):
+    '''Base class of the convergence criteria
+
+    Attributes:
+    last: the statistic computed by the last update (see the subclasses),
+        None before the first update
+    '''
+    __metaclass__ = ABCMeta
+
+    def __init__(self):
+        self.last = None
+
+    @abstractmethod
+    def update(self, optimizer, population):
+        '''Update the criterion with the result of an iteration
+
+        @param optimizer: the `ASOP` object
+        @param population: the `Population` of the iteration
+        @return: True if the optimization has converged
+        '''
+
+        pass
+
+    def reset(self):
+        '''Forget the history of the criterion. Called by `ASOP.optimize`
+        before the first iteration'''
+        self.last = None
+
+    def __repr__(self):
+        parameters = ', '.join('%s=%r'%(k, v)
+                               for (k, v) in sorted(self.__dict__.items())
+                               if not k.startswith('_') and k != 'last')
+        return '%s(%s)'%(self.__class__.__name__, parameters)
+
+
+def normalizedEntropy(p):
+    '''Entropy of the discrete distribution `p`, divided by the entropy of
+    the uniform distribution of the same length. 1 for a uniform
+    distribution, 0 for a distribution concentrated on a single value'''
+
+    p = np.asarray(p, dtype=float)
+    n = len(p)
+    total = p.sum()
+    if (n < 2) or (total <= 0):
+        return 0.0
+    p = p[p > 0] / total
+    return float(-np.dot(p, np.log(p)) / np.log(n))
+
+
+def centralWidth(x, p, mass):
+    '''Width of the interval of sampling values `x` that holds the central
+    `mass` of the discrete distribution `p`'''
+
+    cdf = np.cumsum(p, dtype=float)
+    cdf /= cdf[-1]
+    (lo, hi) = np.searchsorted(cdf, [(1.0 - mass) / 2, (1.0 + mass) / 2])
+    hi = min(hi, len(x) - 1)
+    return float(x[hi]) - float(x[lo])
+
+
+class EntropyCriterion(ConvergenceCriterion):
+    '''Converged when the sampling distribution of every dimension has
+    collapsed: its normalized entropy (see `normalizedEntropy`) is at
+    most `threshold`. `last` is the array of the entropies of the
+    dimensions'''
+
+    def __init__(self, threshold=0.05):
+        assert 0 <= threshold <= 1
+        ConvergenceCriterion.__init__(self)
+        self.threshold = threshold
+
+    def update(self, optimizer, population):
+        self.last = np.array([normalizedEntropy(d.pdfValues)
+                              for d in optimizer.dimensions])
+        return bool(np.all(self.last <= self.threshold))
+
+
+class SupportWidthCriterion(ConvergenceCriterion):
+    '''Converged when the central `mass` of the sampling distribution of
+    every dimension lies within an interval not wider than `maxWidth`.
+    `maxWidth` is either a number or a sequence with one width per
+    dimension. `last` is the array of the widths of the dimensions'''
+
+    def __init__(self, maxWidth, mass=0.95):
+        assert 0 < mass < 1
+        ConvergenceCriterion.__init__(self)
+        self.maxWidth = maxWidth
+        self.mass = mass
+
+    def update(self, optimizer, population):
+        self.last = np.array([centralWidth(d.x, d.pdfValues, self.mass)
+                              for d in optimizer.dimensions])
+        return bool(np.all(self.last <= np.asarray(self.maxWidth)))
+
+
+class StagnationCriterion(ConvergenceCriterion):
+    '''Converged when the best value found so far has not improved by more
+    than `tolerance` during the last `window` iterations. `last` is the
+    number of iterations since the last improvement'''
+
+    def __init__(self, window=20, tolerance=0.0):
+        assert window > 0
+        assert tolerance >= 0
+        ConvergenceCriterion.__init__(self)
+        self.window = window
+        self.tolerance = tolerance
+        self._best = None
+
+    def reset(self):
+        ConvergenceCriterion.reset(self)
+        self._best = None
+
+    def update(self, optimizer, population):
+        goodness = population.values * population.direction
+        goodness = goodness[~np.isnan(goodness)]
+        if len(goodness):
+            best = goodness.max()
+            if (self._best is None) or (best > self._best + self.tolerance):
+                self._best = best
+                self.last = 0
+                return False
+        self.last = (self.last or 0) + 1
+        return self.last >= self.window
+
+
+class SpreadCriterion(ConvergenceCriterion):
+    '''Converged when the standard deviation of the values of the
+    population of an iteration is at most `threshold`. NaN values are
+    ignored. The solutions are counted with their multiplicities (see
+    `Population.weights`), so that a deduplicated population has the
+    spread of the full sample. `last` is the standard deviation'''
+
+    def __init__(self, threshold):
+        assert threshold >= 0
+        ConvergenceCriterion.__init__(self)
+        self.threshold = threshold
+
+    def update(self, optimizer, population):
+        valid = ~np.isnan(population.values)
+        values = population.values[valid]
+        if population.weights is None:
+            weights = np.ones(len(values))
+        else:
+            weights = population.weights[valid]
+        total = weights.sum()
+        if total < 2:
+            return False
+        mean = np.dot(weights, values) / total
+        self.last = float(np.sqrt(np.dot(weights, (values - mean) ** 2) /
+                                  total))
+        return self.last <= self.threshold
+
+
+class AllOf(ConvergenceCriterion):
+    '''Converged when all the given criteria are met in the same iteration.
+    `last` is the list of the results of the criteria'''
+
+    def __init__(self, *criteria):
+        assert criteria
+        ConvergenceCriterion.__init__(self)
+        self.criteria = list(criteria)
+
+    def reset(self):
+        ConvergenceCriterion.reset(self)
+        for c in self.criteria:
+            c.reset()
+
+    def update(self, optimizer, population):
+        #every criterion is updated, so that the incremental ones do not
+        #miss iterations
+        self.last = [c.update(optimizer, population) for c in self.criteria]
+        return all(self.last)
+
+
+def defaultCriteria():
+    '''The criteria that `ASOP.optimize` uses by default: the sampling
+    distributions have collapsed, or the best value stagnated for 20
+    iterations'''
+    return [EntropyCriterion(0.05), StagnationCriterion(20)]
@@ -0,0 +1,148 @@
+'''
+Timers and counters of the phases of the optimization
+'''
+import timeit
+
+#the timed phases of an ASOP iteration:
+#sample -- drawing solutions (and removing duplicates, see ASOP.deduplicate)
+#evaluate -- calling the objective function, including the cache lookups
+#scaling -- creating and applying the scaling function
+#update -- the kernel updates of the scores of the dimensions
+#apply -- applySamplingScore: score to probability conversion and the
+#    sampler rebuild
+#archive -- offering the solutions to the elite archive
+#checkpoint -- automatic checkpoints of `train`
+PHASES = ('sample', 'evaluate', 'scaling', 'update', 'apply', 'archive',
+          'checkpoint')
+
+#counters:
+#evaluations -- objective function calls (solutions, in the vectorized mode)
+#learned -- solutions passed to `learn`. Every learned solution is one
+#    kernel update of every dimension, i.e. this is also the number of
+#    kernel updates per dimension
+COUNTERS = ('evaluations', 'learned')
+
+
+class Instrumentation(object):
+    '''Cumulative and per-iteration timers and counters of an optimizer
+
+    Attributes:
+    totals: dictionary that maps every phase (see PHASES) to its
+        cumulative time in seconds
+    counters: dictionary that maps every counter (see COUNTERS) to its
+        cumulative value
+    history: list of the records of the completed iterations (see
+        `endIteration`), or None if the history is not kept
+    callback: None or a function that receives the record of every
+        completed iteration, e.g. to export it
+
+    An iteration ends with every `ASOP.learn` call, or, in `ASOP.train`,
+    after the automatic checkpoint. The sampling and the evaluations that
+    precede the call belong to its iteration.
+    '''
+
+    def __init__(self, callback=None, keepHistory=True):
+        '''
+        @param callback: see the class documentation. Default: None
+        @param keepHistory: if True (default), the records of the
+            iterations are kept in `self.history`
+        '''
+
+        assert (callback is None) or callable(callback)
+        self.callback = callback
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        if keepHistory:
+            self.history = []
+        else:
+            self.history = None
+        self._times = dict.fromkeys(PHASES, 0.0)
+        self._counters = dict.fromkeys(COUNTERS, 0)
+
+    def __getstate__(self):
+        '''The callback is not a part of the pickled state'''
+        state = self.__dict__.copy()
+        state['callback'] = None
+        return state
+
+    def __repr__(self):
+        return '<%s> %s'%(self.__class__.__name__, ', '.join(
+            '%s %.3fs'%(p, self.totals[p]) for p in PHASES))
+
+    def phase(self, name):
+        '''Context manager that adds the time of its block to `name`'''
+        return _Phase(self, name)
+
+    def add(self, name, seconds):
+        '''Add `seconds` to the time of the phase `name`'''
+        self._times[name] += seconds
+        self.totals[name] += seconds
+
+    def count(self, name, n=1):
+        '''Add `n` to the counter `name`'''
+        self._counters[name] += n
+        self.counters[name] += n
+
+    def endIteration(self, iteration):
+        '''Close the current iteration
+
+        @return: the record of the iteration, a dictionary with the
+            following keys: "iteration" (the iteration index), "times"
+            (phase -> seconds), "counters" (counter -> value) and "total"
+            (the sum of the times)
+        '''
+
+        record = {'iteration': iteration, 'times': self._times,
+                  'counters': self._counters,
+                  'total': sum(self._times.values())}
+        self._times = dict.fromkeys(PHASES, 0.0)
+        self._counters = dict.fromkeys(COUNTERS, 0)
+        if self.history is not None:
+            self.history.append(record)
+        if self.callback is not None:
+            self.callback(record)
+        return record
+
+    def reset(self):
+        '''Zero all the timers and counters and clear the history'''
+        self.__init__(self.callback, self.history is not None)
+
+    def summary(self):
+        '''Human readable table of the cumulative times and counters'''
+        total = sum(self.totals.values())
+        lines = ['%-12s %10.4fs %5.1f%%'%(p, self.totals[p],
+                                            100.0 * self.totals[p] / total
+                                            if total else 0.0)
+                 for p in PHASES]
+        lines.extend('%-12s %11d'%(c, self.counters[c]) for c in COUNTERS)
+        return '\n'.join(lines)
+
+
+class _Phase(object):
+    __slots__ = ('instrumentation', 'name', 'start')
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.start = timeit.default_timer()
+        return self
+
+    def __exit__(self, *excInfo):
+        self.instrumentation.add(self.name,
+                                 timeit.default_timer() - self.start)
+        return False
+
+
+class _NullPhase(object):
+    '''Context manager that does nothing. Used when the instrumentation is
+    disabled'''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        return False
+
+NULL_PHASE = _NullPhase()
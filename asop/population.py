@@ -0,0 +1,98 @@
+'''
+Containers of evaluated solutions
+'''
+import numpy as np
+
+
+class Population(object):
+    '''Structure-of-arrays container of evaluated solutions
+
+    Attributes:
+    solutions: array with one solution per row. Either an (n, D) array or
+        a structured array with one field per dimension (see `ASOP.sample`)
+    values: float array of the n objective function values
+    scaled: float array of the n scaled values used for learning, or None
+    iteration: index of the learning iteration that produced the
+        population, or None
+    direction: MINIMIZE (-1, default) or MAXIMIZE (1). Defines which
+        values are the best ones
+    weights: float array of the n multiplicities of the solutions (see
+        `ASOP.deduplicate`), or None if every solution counts once
+
+    For compatibility with lists of (solution, value) pairs, iterating
+    over a population and indexing it yield (solution tuple, value) pairs.
+    Slicing it and indexing it with an array yield a new population
+    '''
+
+    def __init__(self, solutions, values, scaled=None, iteration=None,
+                 direction=-1, weights=None):
+        solutions = np.asarray(solutions)
+        values = np.asarray(values, dtype=float).ravel()
+        assert len(solutions) == len(values)
+        if scaled is not None:
+            scaled = np.asarray(scaled, dtype=float).ravel()
+            assert len(scaled) == len(values)
+        if weights is not None:
+            weights = np.asarray(weights, dtype=float).ravel()
+            assert len(weights) == len(values)
+        assert direction in (-1, 1)
+        self.solutions = solutions
+        self.values = values
+        self.scaled = scaled
+        self.iteration = iteration
+        self.direction = direction
+        self.weights = weights
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice) or (np.ndim(i) > 0):
+            #slices and index (or boolean) arrays select a new population
+            return self.subset(np.arange(len(self))[i])
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('Population index out of range')
+        solution = tuple(self.solutions[i:i + 1].tolist()[0])
+        return (solution, self.values[i])
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return '<%s> %d solutions, iteration %s'%(self.__class__.__name__,
+                                                   len(self), self.iteration)
+
+    def bestIndices(self, k):
+        '''Indices of the `k` best solutions, the best one first
+
+        The selection is done by partial partitioning, O(n + k log k),
+        rather than by sorting the entire population
+        '''
+
+        assert k >= 0
+        n = len(self)
+        k = min(k, n)
+        if k == 0:
+            return np.array([], dtype=int)
+        key = self.values * (-self.direction) #the best have the lowest key
+        if k < n:
+            ix = np.argpartition(key, k - 1)[:k]
+        else:
+            ix = np.arange(n)
+        return ix[np.argsort(key[ix], kind='mergesort')]
+
+    def best(self, k=1):
+        '''A new population of the `k` best solutions, the best one first'''
+
+        return self.subset(self.bestIndices(k))
+
+    def subset(self, indices):
+        '''A new population of the solutions at `indices`'''
+
+        scaled = None if self.scaled is None else self.scaled[indices]
+        weights = None if self.weights is None else self.weights[indices]
+        return Population(self.solutions[indices], self.values[indices],
+                          scaled, self.iteration, self.direction, weights)
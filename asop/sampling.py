@@ -0,0 +1,240 @@
+'''
+Random number generators for arbitrary distributions
+
+The generators are defined over a sorted set of values and the
+(unnormalized) probability density at these values. The density is
+updated by `set_pdf`, which rebuilds the cumulative distribution in a
+single vectorized pass. `random(n)` locates all the n numbers in the
+cumulative distribution at once, using a guide table: the range of the
+cumulative distribution is split to equal buckets, and the index of the
+first entry of every bucket is precomputed. Every search then starts at
+its bucket and typically needs at most a step or two.
+
+`AliasSampler` draws discrete values without any search, at the price of
+a costlier `set_pdf`.
+
+The tables are stored in the floating point type passed to the
+constructor (float64 by default). With float32 the densities are scaled to
+their peak before any accumulation, so that they neither underflow nor
+overflow.
+'''
+import numpy as np
+
+
+class SamplerBase(object):
+    '''Common functionality of the samplers'''
+
+    def __init__(self, x, pdf, dtype=float):
+        '''
+        @param x: sorted sampling values
+        @param pdf: probability density (not necessarily normalized) at
+            every sampling value. Has to be non-negative, with a positive sum
+        @param dtype: floating point type of the tables. Default: float
+        '''
+
+        self._dtype = np.dtype(dtype)
+        self._xSource = None
+        self._x = None
+        self._cdf = None
+        self._guide = None
+        self.set_pdf(x, pdf)
+
+    def _setX(self, x, dtype):
+        #the variables pass the same sequence on every update. Convert it
+        #only when it changes
+        if x is not self._xSource:
+            self._x = np.asarray(x, dtype=dtype)
+            self._xSource = x
+            self._cdf = np.zeros(len(self._x), dtype=self._dtype)
+        assert len(self._x) > 0
+
+    #number of guide table buckets per entry of the cumulative distribution
+    GUIDE_BUCKETS_PER_VALUE = 2
+    #searches that did not finish after this number of steps from the
+    #guide table fall back to binary search
+    MAX_GUIDED_STEPS = 8
+
+    def _buildGuide(self):
+        cdf = self._cdf
+        nBuckets = self.GUIDE_BUCKETS_PER_VALUE * len(cdf)
+        self._bucketsPerUnit = nBuckets / cdf[-1]
+        self._guide = np.searchsorted(cdf, np.arange(nBuckets) /
+                                      self._bucketsPerUnit, 'right')
+
+    def _search(self, u):
+        '''For every u, the index of the first cumulative distribution
+        entry that is greater than u, i.e. searchsorted(cdf, u, 'right')'''
+        cdf = self._cdf
+        bucket = (u * self._bucketsPerUnit).astype(np.intp)
+        np.minimum(bucket, len(self._guide) - 1, out=bucket)
+        ix = self._guide[bucket]
+        np.minimum(ix, len(cdf) - 1, out=ix)
+        active = np.flatnonzero(cdf[ix] <= u)
+        for step in range(self.MAX_GUIDED_STEPS): #@UnusedVariable
+            if len(active) == 0:
+                return ix
+            ix[active] += 1
+            active = active[cdf[ix[active]] <= u[active]]
+        if len(active):
+            ix[active] = np.searchsorted(cdf, u[active], 'right')
+        return ix
+
+    @staticmethod
+    def _peak(pdf):
+        peak = np.max(pdf)
+        assert peak > 0, 'Probability density has to have a positive sum'
+        return peak
+
+    def _uniform(self, times):
+        '''Uniform random numbers in [0, total probability)'''
+        n = 1 if times is None else times
+        u = np.random.random_sample(n)
+        u *= self._cdf[-1]
+        return u
+
+    def random(self, times=None):
+        '''Randomly sample the distribution
+
+        @param times: sample this number of times. If None (default), return
+            a single number
+        @return: if times is None, return a single number. Else, return an
+            array with `times` numbers in it
+        '''
+        ret = self._draw(self._uniform(times))
+        if times is None:
+            return ret[0]
+        return ret
+
+
+class ContinuousSampler(SamplerBase):
+    '''Sampler of a continuous distribution over [min(x), max(x)]
+
+    The probability mass of the interval between two adjacent sampling
+    values is computed by the trapezoidal rule. Within an interval, the
+    cumulative distribution is interpolated linearly.
+    '''
+
+    def set_pdf(self, x, pdf):
+        self._setX(x, self._dtype)
+        pdf = np.asarray(pdf, dtype=self._dtype)
+        assert pdf.shape == self._x.shape
+        cdf = self._cdf
+        if len(cdf) > 1:
+            #interval mass: 0.5 * (pdf[i] + pdf[i + 1]) * (x[i + 1] - x[i]),
+            #relative to the peak density, so that tiny (e.g. denormal)
+            #densities do not underflow
+            mass = np.add(pdf[:-1], pdf[1:])
+            mass /= self._peak(pdf)
+            dx = np.diff(self._x)
+            mass *= dx
+            np.cumsum(mass, out=cdf[1:])
+            #inverse slope of the CDF within every interval. Intervals
+            #without mass are never selected
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self._slope = np.where(mass > 0, dx / mass, 0.0)
+        else:
+            cdf[0] = 1.0
+        assert cdf[-1] > 0, 'Probability density has to have a positive sum'
+        self._buildGuide()
+
+    def _draw(self, u):
+        x = self._x
+        if len(x) == 1:
+            return np.repeat(x, len(u))
+        interval = self._search(u)
+        interval -= 1
+        np.clip(interval, 0, len(x) - 2, out=interval)
+        ret = u - self._cdf[interval]
+        ret *= self._slope[interval]
+        ret += x[interval]
+        return ret
+
+
+class DiscreteSampler(SamplerBase):
+    '''Sampler of a discrete distribution over the values in x
+
+    Value x[i] is drawn with probability pdf[i] / sum(pdf)
+    '''
+
+    def set_pdf(self, x, pdf):
+        self._setX(x, None)
+        pdf = np.asarray(pdf, dtype=self._dtype)
+        assert pdf.shape == self._x.shape
+        np.divide(pdf, self._peak(pdf), out=self._cdf)
+        np.cumsum(self._cdf, out=self._cdf)
+        assert self._cdf[-1] > 0, \
+            'Probability density has to have a positive sum'
+        self._buildGuide()
+
+    def _draw(self, u):
+        ix = self._search(u)
+        np.minimum(ix, len(self._x) - 1, out=ix)
+        return self._x[ix]
+
+
+class AliasSampler(SamplerBase):
+    '''Sampler of a discrete distribution over the values in x, using the
+    alias method (Walker, Vose)
+
+    Every draw costs O(1): a single uniform number selects a column of
+    the alias table and decides between the column's own value and its
+    alias. Building the table costs O(G log G) for G values, compared to
+    O(G) for the cumulative distribution of `DiscreteSampler`, so the
+    table pays off when many values are drawn per `set_pdf` call (see
+    `benchmarkIntegerSamplers` in examples.py).
+
+    The table is built without a Python loop over the values. Vose's
+    algorithm pairs the values with less than average probability
+    ("small") with those with more ("large"). Processing the small values
+    in a fixed order, with the current large value being replaced by the
+    next one when it drops below average, makes the pairing a function of
+    the cumulative deficits of the small values and the cumulative
+    excesses of the large ones, so that two sorted searches are enough.
+    '''
+
+    def set_pdf(self, x, pdf):
+        self._setX(x, None)
+        pdf = np.asarray(pdf, dtype=self._dtype)
+        assert pdf.shape == self._x.shape
+        n = len(pdf)
+        #the table is built in double precision and stored in self._dtype
+        q = np.divide(pdf, self._peak(pdf), dtype=float)
+        q *= n / np.sum(q)
+        prob = np.ones(n, dtype=self._dtype)
+        alias = np.arange(n)
+        small = np.flatnonzero(q < 1.0)
+        large = np.flatnonzero(q >= 1.0)
+        if len(small) and len(large):
+            deficit = 1.0 - q[small]
+            cumDeficit = np.cumsum(deficit)
+            cumExcess = np.cumsum(q[large] - 1.0)
+            #every small value is aliased to the large value that is
+            #current when the small value's deficit starts
+            current = np.searchsorted(cumExcess, cumDeficit - deficit,
+                                      'right')
+            np.minimum(current, len(large) - 1, out=current)
+            prob[small] = q[small]
+            alias[small] = large[current]
+            #a large value drops below average when the cumulative deficit
+            #crosses its cumulative excess. The overshoot is taken from the
+            #next large value
+            crossing = np.searchsorted(cumDeficit, cumExcess[:-1], 'left')
+            drained = np.flatnonzero(crossing < len(small))
+            overshoot = cumDeficit[crossing[drained]] - cumExcess[drained]
+            prob[large[drained]] = 1.0 - overshoot
+            alias[large[drained]] = large[drained + 1]
+        self._prob = prob
+        self._alias = alias
+
+    def _uniform(self, times):
+        n = 1 if times is None else times
+        return np.random.random_sample(n)
+
+    def _draw(self, u):
+        n = len(self._x)
+        u = u * n
+        column = u.astype(np.intp)
+        np.minimum(column, n - 1, out=column)
+        u -= column
+        ix = np.where(u < self._prob[column], column, self._alias[column])
+        return self._x[ix]
@@ -1,13 +1,41 @@
+from abc import ABCMeta, abstractmethod
+
 import numpy as np
 
 '''Scaling functions
 
 All the functions in this module create scaling functions - functions that
-numerically scale input values
+numerically scale input values. The scaling functions are instances of
+small callable classes rather than closures, so that they can be pickled
+(e.g. as a part of a saved optimizer, see `ASOP.save`)
 '''
 
 
-def TanhScaling(x50, steepness):
+class ScalingBase(object):
+    '''Base class of the scaling functions. The parameters are stored as
+    attributes, so that the functions can be pickled and compared'''
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def __call__(self, inp):
+        pass
+
+    def _parameters(self):
+        return tuple(sorted(self.__dict__.items()))
+
+    def __eq__(self, other):
+        return (type(self) is type(other)) and \
+            (self._parameters() == other._parameters())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '%s(%s)'%(self.__class__.__name__,
+                         ', '.join('%s=%r'%p for p in self._parameters()))
+
+
+class TanhScaling(ScalingBase):
     ''' Sigmoid tanh scaling
 
     Scaled value y is calculated as
@@ -16,8 +44,13 @@ def TanhScaling(x50, steepness):
     steepness factor
     '''
 
-    assert steepness != 0
-    return lambda inp: np.tanh(steepness * np.subtract(inp, x50))
+    def __init__(self, x50, steepness):
+        assert steepness != 0
+        self.x50 = x50
+        self.steepness = steepness
+
+    def __call__(self, inp):
+        return np.tanh(self.steepness * np.subtract(inp, self.x50))
 
 
 def logisticScalingFromValueExtrema(values, yHigh):
@@ -83,18 +116,23 @@ def tanhScalingFromValueExtrema(values, yHigh):
 
 
 
-def LinearScaling(a, b):
+class LinearScaling(ScalingBase):
     '''Simple linear scaling
 
     y = ax + b
     '''
 
-    assert a != 0
-    return lambda inp: np.multiply(a, inp) + b
+    def __init__(self, a, b):
+        assert a != 0
+        self.a = a
+        self.b = b
 
+    def __call__(self, inp):
+        return np.multiply(self.a, inp) + self.b
 
 
-def LogisticScaling(x50, steepness):
+
+class LogisticScaling(ScalingBase):
     '''Logistic sigmoid scaling
 
     y = 1.0 / (1 + exp(-x50 - s * x))
@@ -103,8 +141,13 @@ def LogisticScaling(x50, steepness):
     s is the steepness factor
     '''
 
-    assert steepness != 0
-    return lambda inp: 1.0 / (1 + np.exp(-steepness * np.subtract(inp, x50)))
+    def __init__(self, x50, steepness):
+        assert steepness != 0
+        self.x50 = x50
+        self.steepness = steepness
+
+    def __call__(self, inp):
+        return 1.0 / (1 + np.exp(-self.steepness * np.subtract(inp, self.x50)))
 
 
 
@@ -2,37 +2,96 @@
 Various variable types to be used by ASOP
 '''
 from abc import ABCMeta, abstractmethod
-from scipy.stats.distributions import norm
+from scipy.signal import fftconvolve
 import numpy as np
-from copy import copy
-import sys
-
-try:
-    import randomArbitrary
-except ImportError, e:
-    type_, value, traceback = sys.exc_info()
-    msg = 'Failed to import moodule named randomArbitrary. '\
-    'If you clone ASOP from a git repository, note that randomArbitrary is a'\
-    'submodule. Use recursive cloning. Alternatively, `cd` to asop root '\
-    'directory and type: \n'\
-    'git submodule init\n'\
-    'git submodule update\n\n'
-    raise ImportError(msg + value.message)
-
-
-
-def inverseLogit(logit):
-    logit = np.array(logit)
-    finfo = np.finfo(float)
-    mx = -np.log(finfo.eps)
-    mn = np.log(finfo.eps)
-    ret = np.empty(logit.shape)
-    selAboveMax = np.greater(logit, mx)
-    selBelowMin = np.less(logit, mn)
-    sel = (-selAboveMax) * (-selBelowMin)
-    ret[selAboveMax] = 1.0
-    ret[selBelowMin] = 0.0
-    ret[sel] = 1 / (1.0 + np.exp(-logit[sel]))
+
+import sampling
+
+
+def inverseLogit(logit, out=None, overwriteInput=False):
+    '''The logistic function 1 / (1 + exp(-logit))
+
+    The function is computed as exp(min(logit, 0) - log1p(exp(-|logit|))),
+    which neither overflows nor loses relative precision for large
+    negative logits.
+    @param logit: array of logit values
+    @param out: (optional) float array of the same shape, to store the
+        result in. If None (default), a new array is allocated
+    @param overwriteInput: if True, `logit` has to be a float array and is
+        used as work space, i.e. its values are destroyed. This way, no
+        temporary arrays are allocated. Default: False
+    @return: the array with the results
+    '''
+    if overwriteInput:
+        work = logit
+    else:
+        work = np.array(logit, dtype=float)
+    if out is None:
+        out = np.empty(work.shape, dtype=work.dtype)
+    np.abs(work, out=out)
+    np.negative(out, out=out)
+    np.exp(out, out=out)
+    np.log1p(out, out=out)
+    np.minimum(work, 0.0, out=work)
+    work -= out
+    np.exp(work, out=out)
+    return out
+
+
+def sharedGrid(values, dtype=None):
+    '''Read-only array of sampling values, that variables can share
+
+    Variables store their sampling values as read-only arrays. If
+    `values` already is a read-only array of the requested type, the
+    variable keeps a reference to it instead of a copy. Thus, many
+    variables over the same grid can be created as follows:
+        grid = sharedGrid(np.linspace(-2, 2, 1000))
+        dimensions = [ContinuousVariable(grid) for i in range(200)]
+    @param values: sequence of sampling values
+    @param dtype: (optional) the type of the array. If None (default), it
+        is derived from the values
+    @return: read-only array with the values
+    '''
+    if isinstance(values, np.ndarray) and not values.flags.writeable and \
+            (dtype is None or values.dtype == dtype):
+        return values
+    ret = np.array(values, dtype=dtype)
+    ret.flags.writeable = False
+    return ret
+
+
+def readOnlyView(a):
+    '''Read-only view of the array `a`, that shares its memory'''
+    ret = a.view()
+    ret.flags.writeable = False
+    return ret
+
+
+def gaussianKernel(x, locations, width, dtype=float):
+    '''Evaluate normal PDFs centered at `locations` over the points `x`
+
+    @param x: either a 1-D array of points, common to all the kernels, or
+        a 2-D array whose row i holds the points of the i-th kernel
+    @param locations: array of kernel centers. 1-D, or, if `x` is 1-D,
+        of any shape
+    @param width: standard deviation of every kernel. Has to be positive
+    @param dtype: floating point type of the computation. Default: float
+    @return: array of shape (len(locations), number of points) in which
+        row i holds the values of norm.pdf(x_i, locations[i], width).
+        If `x` is 1-D, the shape is locations.shape + (len(x), ): the
+        kernel of every location over all the points
+    '''
+    locations = np.asarray(locations, dtype=dtype)
+    x = np.asarray(x, dtype=dtype)
+    if x.ndim == 1:
+        ret = np.subtract.outer(locations, x)
+    else:
+        ret = np.subtract(locations[:, np.newaxis], x)
+    ret /= width
+    np.square(ret, out=ret)
+    ret *= -0.5
+    np.exp(ret, out=ret)
+    ret *= 1.0 / (width * np.sqrt(2 * np.pi))
     return ret
 
 
@@ -98,6 +157,33 @@ def asciiXYplot(x, y, strTitle=None, marker='|'):
 class VariableBase(object):
     '''Abstract class for every variable type'''
     __metaclass__ = ABCMeta
+    __slots__ = ('_x', '_scores', '_probabilityCalculationStrategy', 'name',
+                 '_workScores', '_workProbability', '_pdfValues', '_rng',
+                 'samplingStd', '_nUpdates', 'dtype')
+
+    #work arrays and the sampler, that are recreated rather than pickled.
+    #The sampler tables are a function of the sampling values and of the
+    #probability density, and are larger than both
+    _SCRATCH_SLOTS = ('_workScores', '_workProbability', '_rng')
+
+    def __getstate__(self):
+        '''The values of the slots of all the classes of the variable,
+        without the work arrays and the sampler'''
+        state = {}
+        for cls in type(self).__mro__:
+            for slot in getattr(cls, '__slots__', ()):
+                if (slot not in self._SCRATCH_SLOTS) and hasattr(self, slot):
+                    state[slot] = getattr(self, slot)
+        return state
+
+    def __setstate__(self, state):
+        for (slot, value) in state.items():
+            setattr(self, slot, value)
+        self._workScores = np.empty(len(self._x), dtype=self.dtype)
+        self._workProbability = np.empty(len(self._x), dtype=self.dtype)
+        #rebuilt by the first `random` or `applySamplingScore` call, so
+        #that loading many variables does not rebuild all their tables
+        self._rng = None
 
     @staticmethod
     def probabilityFromScore(score):
@@ -108,28 +194,40 @@ class VariableBase(object):
         '''
 
         p = inverseLogit(score)
-        if np.sum(p) > 0:
-            p = p / np.sum(p)
-        else:
-            p = np.ones(len(p), dtype=float) / float(len(p))
+        VariableBase._normalizeProbability(p)
         return p
 
+    @staticmethod
+    def _normalizeProbability(p):
+        '''Normalize p to unit sum, in place. If all its values are zero,
+        make it uniform'''
+        total = np.sum(p)
+        if total > 0:
+            p /= total
+        else:
+            p.fill(1.0 / len(p))
+
 
 
     def __init__(self, samplingValues, samplingScores=None,
                  samplingStd=None,
-                 name=None,
+                 name=None, dtype=float,
                  **kwparam):
         '''Initialize the variable
 
         @param samplingValues: the values over which the sampling distribution
-            is defined.
+            is defined. Stored as a read-only array, which is shared rather
+            than copied if possible (see `sharedGrid`)
         @param samplingScores: the scores associated with the sampling values.
             If a single value is passed, it will be used `len(samplingValues)`
-            times
+            times. The scores are stored as a float array, which is updated
+            in place
         @param samplingStd: standard deviation of sampling. If None (default)
             this value is estimated as the range of sampling values divided
             by 100.0
+        @param dtype: floating point type of the scores, the probability
+            density and the sampler tables (and of the sampling values of
+            continuous variables). Default: float. See `setDtype`
 
         Keyword parameters:
         _probabilityCalculationStrategy: EXPERIMENTAL parameter. One of the
@@ -143,18 +241,17 @@ class VariableBase(object):
 
         '''
 
-        if samplingValues is not None:
-            self._x = list(samplingValues)
-        else:
-            self._x = self._defaultSamplingValues()
+        self.dtype = np.dtype(dtype)
+        if samplingValues is None:
+            samplingValues = self._defaultSamplingValues()
+        self._x = sharedGrid(samplingValues, self._gridDtype())
 
         if samplingScores is not None:
-            try:
-                self._scores = list(samplingScores)
-            except TypeError:
-                self._scores = [samplingScores] * len(self.x)
+            self._scores = np.array(samplingScores, dtype=self.dtype)
+            if self._scores.ndim == 0:
+                self._scores = np.repeat(self._scores, len(self.x))
         else:
-            self._scores = self._defaultScores(self.x)
+            self._scores = self._defaultScores(self.x, self.dtype)
 
         assert len(self.x) == len(self.scores),\
             'Length of sampling values (%d) should be equal to the '\
@@ -168,12 +265,14 @@ class VariableBase(object):
                                'STANDARDIZED')
         self._probabilityCalculationStrategy = strategy
         self.name = name
-        pValues = self._probabilityFromScore()
-        self._pdfValues = pValues
+        #work arrays of the score to probability conversion. Reused by
+        #every applySamplingScore
+        self._workScores = np.empty(len(self.x), dtype=self.dtype)
+        self._workProbability = np.empty(len(self.x), dtype=self.dtype)
+        self._pdfValues = self._probabilityFromScore().copy()
         self._rng = self._createRNG()
-        self.rand = self.random #alias
         if samplingStd is None:
-            samplingStd = (max(self.x) - min(self.x)) / 4.0
+            samplingStd = (np.max(self.x) - np.min(self.x)) / 4.0
             #the above line means that we assume the entire
             #range covers more than 99.9% of a normally distributed
             #random variable
@@ -181,15 +280,42 @@ class VariableBase(object):
 
         self._nUpdates = 0
 
-    def get_pdf_values(self):
-        return copy(self._pdfValues)
-
-
-    def get_x_values(self):
-        return copy(self._x)
+    def _gridDtype(self):
+        '''Type of the sampling values array. If None, it is derived from
+        the values passed to __init__'''
+        return None
+
+    def setDtype(self, dtype, samplingValues=None):
+        '''Convert the state of the variable to another floating point type
+
+        With numpy.float32, the scores, the probability density and the
+        sampler tables take half the memory (and memory traffic) of the
+        default float64. The probability density is renormalized to unit
+        sum by every `applySamplingScore`, so it does not underflow.
+        @param samplingValues: (optional) sampling values, equal to the
+            current ones, already converted by another variable. Passing
+            the `x` of a variable that shares the grid with this one and
+            was converted first keeps the grid shared (see `sharedGrid`).
+            Default: None, i.e. the sampling values are converted
+        '''
+        self.dtype = np.dtype(dtype)
+        if samplingValues is None:
+            samplingValues = self._x
+        else:
+            assert len(samplingValues) == len(self._x)
+        self._x = sharedGrid(samplingValues, self._gridDtype())
+        self._scores = self._scores.astype(self.dtype)
+        self._workScores = np.empty(len(self.x), dtype=self.dtype)
+        self._workProbability = np.empty(len(self.x), dtype=self.dtype)
+        self._pdfValues = self._pdfValues.astype(self.dtype)
+        self._rng = self._createRNG()
 
+    def get_pdf_values(self):
+        '''Read-only view of the probability density at the sampling
+        values. The view reflects later updates; copy it to keep the
+        current values'''
+        return readOnlyView(self._pdfValues)
 
-    x = property(get_x_values)
     pdfValues = property(get_pdf_values)
 
 
@@ -202,11 +328,13 @@ class VariableBase(object):
 
 
     def get_x(self):
+        '''Read-only array of the sampling values'''
         return self._x
 
 
     def get_scores(self):
-        return self._scores
+        '''Read-only view of the sampling scores'''
+        return readOnlyView(self._scores)
 
     x = property(get_x, None, None, None)
     scores = property(get_scores, None, None, None)
@@ -222,8 +350,20 @@ class VariableBase(object):
         @return: if times is None, return a single number. Else, return a list
             with `times` numbers in it
         '''
+        if self._rng is None:
+            self._rng = self._createRNG()
         return self._rng.random(times)
 
+    rand = random #alias
+
+    def _setRNGPdf(self):
+        '''Rebuild the sampler tables from the current probability
+        density'''
+        if self._rng is None:
+            self._rng = self._createRNG()
+        else:
+            self._rng.set_pdf(self.x, self._pdfValues)
+
     def applySamplingScore(self):
         '''Synchronize the internal PDF with the sampling score
 
@@ -231,13 +371,13 @@ class VariableBase(object):
         the sampling score
         '''
 
-        pdfValues = np.multiply(self.pdfValues,
-                                      self._probabilityFromScore())
-        if np.all(pdfValues==0):
-            pdfValues = np.ones(len(pdfValues), dtype=float) / len(pdfValues)
-        self._pdfValues = pdfValues
-        self._rng.set_pdf(self.x, self._pdfValues)
-        self._scores = self._defaultScores(self.x)
+        pdfValues = self._pdfValues
+        pdfValues *= self._probabilityFromScore()
+        #the factors sum to one, so the density would shrink by every
+        #update until it underflows
+        self._normalizeProbability(pdfValues)
+        self._setRNGPdf()
+        self._scores.fill(0.0)
 
 
     def alterSamplingDistribution(self, amount, location, width,
@@ -260,6 +400,45 @@ class VariableBase(object):
             self.applySamplingScore()
 
 
+    def alterSamplingDistributionBatch(self, amounts, locations, width,
+                                       immediateApply=True, method='kernel'):
+        '''Update the underlying distribution function at many locations
+
+        With the default method, the result is identical to calling
+        `alterSamplingDistribution` once for every (amount, location) pair,
+        but the variable may process the entire batch in a handful of array
+        operations.
+        @param amounts: sequence of update amounts
+        @param locations: sequence of update locations. Has to be of the
+            same length as `amounts`
+        @param width: how wide should every update be
+        @param immediateApply: see `alterSamplingDistribution`
+        @param method: one of the following:
+            "kernel" (default) -- evaluate the kernel of every update
+            "histogram" -- accumulate the amounts into a weighted histogram
+                over the sampling values and convolve it with the kernel
+                once. The cost does not depend on the product of the batch
+                size and the number of sampling values, at the price of
+                moving every update location to the neighboring sampling
+                values (see `_updateInternalSamplingScoreHistogram`)
+        '''
+
+        amounts = np.asarray(amounts, dtype=float)
+        locations = np.asarray(locations)
+        assert amounts.shape == locations.shape
+        assert(width >= 0)
+        self._nUpdates += len(amounts)
+        if method == 'kernel':
+            self._updateInternalSamplingScoreBatch(amounts, locations, width)
+        elif method == 'histogram':
+            self._updateInternalSamplingScoreHistogram(amounts, locations,
+                                                       width)
+        else:
+            raise ValueError('Unknown update method "%s"'%method)
+        if immediateApply:
+            self.applySamplingScore()
+
+
     @abstractmethod
     def _updateInternalSamplingScore(self, amount, location, width):
         '''This function performs the actual changes to the sampling score
@@ -267,9 +446,24 @@ class VariableBase(object):
 
         pass
 
+    def _updateInternalSamplingScoreBatch(self, amounts, locations, width):
+        '''Perform many score updates. Variable types that can process the
+        batch as a whole should override this function'''
+
+        for (amount, location) in zip(amounts, locations):
+            self._updateInternalSamplingScore(amount, location, width)
+
+    def _updateInternalSamplingScoreHistogram(self, amounts, locations,
+                                              width):
+        '''Perform many score updates through a weighted histogram.
+        Variable types that do not support this method fall back to the
+        regular batch update'''
+
+        self._updateInternalSamplingScoreBatch(amounts, locations, width)
+
     @classmethod
-    def _defaultScores(cls, x):
-        return [0.0] * len(x)
+    def _defaultScores(cls, x, dtype=float):
+        return np.zeros(len(x), dtype=dtype)
 
 
     @staticmethod
@@ -279,25 +473,35 @@ class VariableBase(object):
 
 
     def _probabilityFromScore(self):
+        '''Sampling probability of every sampling value, computed from the
+        current scores according to `_probabilityCalculationStrategy`.
+
+        The result is stored in a work array of the variable, which the
+        next call overwrites.
+        '''
 
         #implementation note: there are two very similar
         #functions: the static function probabilityFromScore
         #and this one. This separation is intentional.
         #Among others, it allows more convenient testing
 
-#        scores = (self.scores - np.mean(self.scores))
+        scores = self._workScores
+        np.copyto(scores, self._scores)
         strategy = self._probabilityCalculationStrategy
         if strategy == 'RAW':
-            scores = self.scores
-        elif strategy == 'CENTERED':
-            scores = self.scores - np.mean(self.scores)
-        elif strategy == 'STANDARDIZED':
-            scores = self.scores - np.mean(self.scores)
-            if np.std(self.scores) != 0:
-                scores /= np.std(self.scores)
+            pass
+        elif strategy in ('CENTERED', 'STANDARDIZED'):
+            scores -= np.mean(scores)
+            if strategy == 'STANDARDIZED':
+                std = np.sqrt(np.dot(scores, scores) / len(scores))
+                if std != 0:
+                    scores /= std
         else:
             raise ValueError('_probabilityCalculationStrategy parameter has an illegal value of "%s"'%strategy)
-        return self.probabilityFromScore(scores)
+        p = inverseLogit(scores, out=self._workProbability,
+                         overwriteInput=True)
+        self._normalizeProbability(p)
+        return p
 
     def __repr__(self):
         if self.name is None:
@@ -316,19 +520,69 @@ class VariableBase(object):
 class QuantitativeVariableBase(VariableBase):
     '''Base class for every quantitative variable type'''
     __metaclass__ = ABCMeta
+    __slots__ = ('kernelTruncation', '_grid', '_gridStep')
+
+    #maximal number of kernel values that a batch update evaluates at once.
+    #Limits the memory of the (locations x grid) intermediate matrix
+    BATCH_CHUNK_SIZE = 2 ** 20
+
+    #histogram updates use FFT convolution when both the histogram and
+    #the kernel are longer than this. Otherwise, direct convolution is used
+    DIRECT_CONVOLUTION_MAX_SIZE = 64
 
     def __init__(self, samplingValues=None, samplingScores=None,
-                 name=None,
+                 name=None, kernelTruncation=None,
                  **kwparam):
         '''See the documentation of `VariableBase`.
+
+        @param kernelTruncation: if None (default), every update of the
+            sampling score evaluates its normal kernel over the entire
+            range of the sampling values. Otherwise, a positive number k:
+            the kernel is evaluated only over the sampling values that lie
+            within k update widths from the update location. The window is
+            located by binary search, so that the update cost is
+            proportional to the number of sampling values in the window
+            rather than to the total number of sampling values.
+
+            Error bound: a sampling value that lies outside the window
+            would have received at most |amount| * exp(-k^2 / 2) /
+            (width * sqrt(2 * pi)), i.e. exp(-k^2 / 2) of the kernel peak,
+            and the total omitted area is |amount| * erfc(k / sqrt(2)).
+            For k=6 the relative point-wise error is below 1.6e-8, for k=8
+            it is below 1.3e-14.
         '''
 
         samplingValues = self.parseSamplingValuesArgument(samplingValues)
+        assert (kernelTruncation is None) or (kernelTruncation > 0)
+        self.kernelTruncation = kernelTruncation
 
         VariableBase.__init__(self, samplingValues=samplingValues,
                               samplingScores=samplingScores,
                               name=name,
                               **kwparam)
+        #sorted float array of the sampling values, for binary search and
+        #vectorized kernel evaluation. The same array as self.x unless the
+        #sampling values are not floats
+        self._grid = np.asarray(self.x, dtype=self.dtype)
+        self._setGridStep()
+
+    def _gridDtype(self):
+        return self.dtype
+
+    def setDtype(self, dtype, samplingValues=None):
+        VariableBase.setDtype(self, dtype, samplingValues)
+        self._grid = np.asarray(self.x, dtype=self.dtype)
+        self._setGridStep()
+
+    def _setGridStep(self):
+        '''Set _gridStep: the distance between two adjacent sampling
+        values if they are equally spaced, None otherwise'''
+        self._gridStep = None
+        if len(self._grid) > 1:
+            steps = np.diff(self._grid)
+            if np.allclose(steps, steps[0], rtol=1e-9, atol=0):
+                self._gridStep = (self._grid[-1] - self._grid[0]) / \
+                    (len(self._grid) - 1)
 
 
     @classmethod
@@ -338,7 +592,7 @@ class QuantitativeVariableBase(VariableBase):
         if samplingValues is None:
             samplingValues = cls._defaultSamplingValues()
         else:
-            samplingValues = np.array(samplingValues)
+            samplingValues = np.asarray(samplingValues)
             s = samplingValues[0:-1] - samplingValues[1:]
             if not np.all(np.sign(s) == -1):
                 msg = 'Sampling values that are passed to a quantitative '\
@@ -354,8 +608,136 @@ class QuantitativeVariableBase(VariableBase):
         such that the area under the PDF curve equals the absolute value of
         `amount`. The resulting curve is then added to the score
         '''
-        values = norm.pdf(self.x, location, width) * amount
-        self._scores = [v1 + v2 for (v1, v2) in zip(self._scores, values)]
+        if self.kernelTruncation is None:
+            (lo, hi) = (0, len(self._grid))
+        else:
+            (lo, hi) = self._kernelWindow(location, width)
+        values = gaussianKernel(self._grid[lo:hi], [location], width,
+                                self.dtype)[0]
+        values *= amount
+        self._scores[lo:hi] += values
+
+    def _kernelWindow(self, location, width):
+        '''Indices of the sampling values within `kernelTruncation` widths
+        from `location`. Accepts either a single location or an array
+        of locations'''
+        halfWidth = self.kernelTruncation * width
+        lo = np.searchsorted(self._grid, np.subtract(location, halfWidth),
+                             'left')
+        hi = np.searchsorted(self._grid, np.add(location, halfWidth),
+                             'right')
+        return (lo, hi)
+
+    def _updateInternalSamplingScoreBatch(self, amounts, locations, width):
+        '''Sum the kernels of all the updates using array operations
+
+        The kernels are evaluated in chunks of locations, such that no more
+        than `BATCH_CHUNK_SIZE` values are held in memory at once
+        '''
+        if self.kernelTruncation is None:
+            total = self._fullKernelSum(amounts, locations, width)
+        else:
+            total = self._windowedKernelSum(amounts, locations, width)
+        self._scores += total
+
+    def _fullKernelSum(self, amounts, locations, width):
+        x = self._grid
+        total = np.zeros(len(x), dtype=self.dtype)
+        amounts = np.asarray(amounts, dtype=self.dtype)
+        chunk = max(1, self.BATCH_CHUNK_SIZE // len(x))
+        for start in range(0, len(amounts), chunk):
+            kernels = gaussianKernel(x, locations[start:start + chunk], width,
+                                     self.dtype)
+            total += np.dot(amounts[start:start + chunk], kernels)
+        return total
+
+    def _windowedKernelSum(self, amounts, locations, width):
+        '''Every location updates only its own window of sampling values.
+        The windows are padded to the widest one and the contributions are
+        accumulated with a weighted bincount'''
+        x = self._grid
+        total = np.zeros(len(x))
+        (lo, hi) = self._kernelWindow(locations, width)
+        span = np.max(hi - lo) if len(lo) else 0
+        if span == 0:
+            return total
+        offsets = np.arange(span)
+        chunk = max(1, self.BATCH_CHUNK_SIZE // span)
+        for start in range(0, len(amounts), chunk):
+            stop = start + chunk
+            ix = lo[start:stop, np.newaxis] + offsets
+            outside = ix >= hi[start:stop, np.newaxis]
+            np.minimum(ix, len(x) - 1, out=ix)
+            kernels = gaussianKernel(x[ix], locations[start:stop], width,
+                                     self.dtype)
+            kernels *= amounts[start:stop, np.newaxis]
+            kernels[outside] = 0.0
+            total += np.bincount(ix.ravel(), weights=kernels.ravel(),
+                                 minlength=len(x))
+        return total
+
+    def _updateInternalSamplingScoreHistogram(self, amounts, locations,
+                                              width):
+        '''Bin the updates onto the sampling values, then convolve.
+
+        Every update amount is split between the two sampling values that
+        surround its location, proportionally to the distance (linear
+        binning, locations outside the range go to the edge values).
+        The weighted histogram is then convolved with the normal kernel
+        once. The binning error is of the order of (step / width)^2, where
+        step is the distance between adjacent sampling values; it vanishes
+        when all the locations are sampling values.
+
+        The cost is O(N + G log G) for N updates over G equally spaced
+        sampling values. For unequally spaced values, the kernels are
+        evaluated at the occupied bins only, which is O(N + B * G) for B
+        occupied bins
+        '''
+        if width == 0:
+            self._updateInternalSamplingScoreBatch(amounts, locations, width)
+            return
+        hist = self._weightedHistogram(amounts, locations)
+        if self._gridStep is None:
+            occupied = np.flatnonzero(hist)
+            if self.kernelTruncation is None:
+                total = self._fullKernelSum(hist[occupied],
+                                            self._grid[occupied], width)
+            else:
+                total = self._windowedKernelSum(hist[occupied],
+                                                self._grid[occupied], width)
+        else:
+            total = self._convolveWithKernel(hist, width)
+        self._scores += total
+
+    def _weightedHistogram(self, amounts, locations):
+        x = self._grid
+        n = len(x)
+        if n == 1:
+            return np.array([np.sum(amounts)])
+        right = np.searchsorted(x, locations, 'right')
+        np.clip(right, 1, n - 1, out=right)
+        left = right - 1
+        fraction = (np.asarray(locations, dtype=float) - x[left]) / \
+            (x[right] - x[left])
+        np.clip(fraction, 0.0, 1.0, out=fraction)
+        hist = np.bincount(left, weights=amounts * (1.0 - fraction),
+                           minlength=n)
+        hist += np.bincount(right, weights=amounts * fraction, minlength=n)
+        return hist
+
+    def _convolveWithKernel(self, hist, width):
+        n = len(hist)
+        nOffsets = n - 1
+        if self.kernelTruncation is not None:
+            nOffsets = min(nOffsets,
+                           int(self.kernelTruncation * width / self._gridStep))
+        offsets = np.arange(-nOffsets, nOffsets + 1) * self._gridStep
+        kernel = gaussianKernel(offsets, [0.0], width, self.dtype)[0]
+        if min(n, len(kernel)) <= self.DIRECT_CONVOLUTION_MAX_SIZE:
+            total = np.convolve(hist, kernel)
+        else:
+            total = fftconvolve(hist, kernel)
+        return total[nOffsets:nOffsets + n]
 
 
 
@@ -364,10 +746,114 @@ class QuantitativeVariableBase(VariableBase):
 
 class ContinuousVariable(QuantitativeVariableBase):
     '''Continuous variable'''
+    __slots__ = ('refineEvery', 'maxGridSize', '_nApplied')
+
+    #grid refinement drops the tails of the distribution that hold less
+    #than this share of the probability mass
+    REFINEMENT_TAIL_MASS = 1e-6
+    #share of the refined grid points that are spread uniformly over the
+    #kept range, regardless of the probability mass
+    REFINEMENT_UNIFORM_SHARE = 0.2
+
+    def __init__(self, samplingValues=None, samplingScores=None,
+                 name=None, refineEvery=None, maxGridSize=None,
+                 **kwparam):
+        '''See the documentation of `QuantitativeVariableBase`.
+
+        @param refineEvery: if None (default), the sampling values are
+            fixed. Otherwise, a positive number n: every n-th call to
+            `applySamplingScore` calls `refineGrid`, so that a coarse
+            initial grid becomes fine where the probability mass
+            concentrates
+        @param maxGridSize: upper bound of the number of sampling values.
+            A refined grid keeps the current number of sampling values,
+            reduced to `maxGridSize` if it is larger. If None (default),
+            the number is not bounded
+        '''
+        assert (refineEvery is None) or (refineEvery > 0)
+        assert (maxGridSize is None) or (maxGridSize >= 2)
+        self.refineEvery = refineEvery
+        self.maxGridSize = maxGridSize
+        self._nApplied = 0
+        QuantitativeVariableBase.__init__(self,
+                                          samplingValues=samplingValues,
+                                          samplingScores=samplingScores,
+                                          name=name,
+                                          **kwparam)
+
+    def applySamplingScore(self):
+        QuantitativeVariableBase.applySamplingScore(self)
+        self._nApplied += 1
+        if self.refineEvery and self._nApplied % self.refineEvery == 0:
+            self.refineGrid()
+
+    def refineGrid(self, size=None):
+        '''Place the sampling values where the probability mass is
+
+        The tails of the distribution that together hold less than
+        `REFINEMENT_TAIL_MASS` of the probability mass are dropped. Over
+        the remaining range, the new sampling values are the quantiles of
+        a mixture of the current distribution (with weight
+        1 - `REFINEMENT_UNIFORM_SHARE`) and the uniform distribution, so
+        that the grid becomes dense where the mass concentrates and no
+        region of the range is left empty. The probability density is
+        interpolated onto the new sampling values. Pending score updates
+        are lost, call `applySamplingScore` first.
+        @param size: the number of new sampling values. If None (default),
+            the current number. In both cases, at most `maxGridSize`
+        '''
+        if size is None:
+            size = len(self._grid)
+        if self.maxGridSize is not None:
+            size = min(size, self.maxGridSize)
+        assert size >= 2
+        x = self._grid
+        pdf = self._pdfValues
+        if len(x) < 2:
+            return
+        #cumulative mass at the sampling values, trapezoidal rule
+        mass = np.add(pdf[:-1], pdf[1:])
+        mass *= np.diff(x)
+        cdf = np.zeros(len(x))
+        np.cumsum(mass, out=cdf[1:])
+        if cdf[-1] <= 0:
+            return
+        cdf /= cdf[-1]
+        tail = self.REFINEMENT_TAIL_MASS / 2
+        lo = np.interp(tail, cdf, x)
+        hi = np.interp(1.0 - tail, cdf, x)
+        if not hi > lo:
+            return
+        #mixture CDF over the kept range, evaluated at the current values
+        #within it and at the range ends
+        inside = x[(x > lo) & (x < hi)]
+        knots = np.concatenate(([lo], inside, [hi]))
+        share = self.REFINEMENT_UNIFORM_SHARE
+        mixture = np.interp(knots, x, cdf)
+        mixture -= mixture[0]
+        mixture *= (1.0 - share) / mixture[-1]
+        mixture += share * (knots - lo) / (hi - lo)
+        newX = np.interp(np.linspace(0.0, 1.0, size), mixture, knots)
+        newPdf = np.interp(newX, x, pdf)
+        self._setSamplingValues(newX, newPdf)
+
+    def _setSamplingValues(self, x, pdf):
+        '''Replace the sampling values and the probability density at them.
+        The scores are reset'''
+        self._x = sharedGrid(x, self._gridDtype())
+        self._grid = self._x
+        self._setGridStep()
+        n = len(x)
+        self._scores = self._defaultScores(x, self.dtype)
+        self._workScores = np.empty(n, dtype=self.dtype)
+        self._workProbability = np.empty(n, dtype=self.dtype)
+        self._pdfValues = np.array(pdf, dtype=self.dtype)
+        if not np.any(self._pdfValues):
+            self._pdfValues.fill(1.0 / n)
+        self._setRNGPdf()
 
     def _createRNG(self):
-        rng = randomArbitrary.RandomArbitrary(self.x,
-                                          self.pdfValues)
+        rng = sampling.ContinuousSampler(self.x, self.pdfValues, self.dtype)
         return rng
 
     @staticmethod
@@ -384,10 +870,31 @@ class IntegerVariable(QuantitativeVariableBase):
     If value truncation results in non-unique values, an exception will be
     raised
     '''
+    __slots__ = ('sampler',)
+
+    #sampler types. See the documentation of __init__
+    SAMPLERS = {'alias': sampling.AliasSampler,
+                'cdf': sampling.DiscreteSampler}
 
     def __init__(self, samplingValues=None, samplingScores=None,
-                 name=None,
+                 name=None, sampler='alias',
                  **kwparam):
+        '''See the documentation of `QuantitativeVariableBase`.
+
+        @param sampler: how the variable is sampled. One of the following:
+            "alias" (default) -- an alias table (`sampling.AliasSampler`)
+                is rebuilt by every `applySamplingScore`, after which every
+                draw costs O(1)
+            "cdf" -- a cumulative distribution (`sampling.DiscreteSampler`)
+                is rebuilt by every `applySamplingScore`. The rebuild is
+                cheaper, but every draw searches the cumulative
+                distribution. Preferable when the number of draws between
+                two updates is small compared to the number of sampling
+                values (see `benchmarkIntegerSamplers` in examples.py)
+        '''
+        if sampler not in self.SAMPLERS:
+            raise ValueError('Unknown sampler "%s"'%sampler)
+        self.sampler = sampler
         samplingValues = self.parseSamplingValuesArgument(samplingValues)
         (samplingValues, samplingScores) = \
             self._prepareSamplingValuesAndScores(samplingValues,
@@ -398,6 +905,9 @@ class IntegerVariable(QuantitativeVariableBase):
                                           name=name,
                                           **kwparam)
 
+    def _gridDtype(self):
+        return int
+
     @classmethod
     def parseSamplingValuesArgument(cls, samplingValues):
 
@@ -405,9 +915,10 @@ class IntegerVariable(QuantitativeVariableBase):
             QuantitativeVariableBase.parseSamplingValuesArgument(samplingValues)
         if samplingValues is None:
             samplingValues = cls._defaultSamplingValues()
-        else:
-            samplingValues = np.array(samplingValues, dtype=int)
-        if len(samplingValues) != len(set(samplingValues)):
+        samplingValues = np.asarray(samplingValues, dtype=int)
+        #the values are sorted, so that truncation can only create
+        #conflicts between neighbors
+        if np.any(np.diff(samplingValues) == 0):
             msg = '''%s: the sampling values contains conflicts'''%\
                     cls.__name__
             raise ValueError(msg)
@@ -422,27 +933,45 @@ class IntegerVariable(QuantitativeVariableBase):
             scores = cls._defaultScores(x)
         mn = np.min(x)
         mx = np.max(x)
+        if mx - mn + 1 == len(x):
+            #the values already cover the entire range. Keep the array,
+            #which may be shared with other variables
+            return (x, scores)
         fullRange = np.arange(mn, mx + 1, 1)
-        fullScores = []
-        for xVal in fullRange:
-            tmp = np.where(x == xVal)[0]
-            if len(tmp):
-                fullScores.append(scores[tmp[0]])
-            else:
-                fullScores.append(DEFAULT_ABSCENT_INT_SCORE)
-        return (fullRange, np.array(fullScores))
+        fullScores = np.empty(len(fullRange))
+        fullScores.fill(DEFAULT_ABSCENT_INT_SCORE)
+        fullScores[x - mn] = scores
+        return (fullRange, fullScores)
+
+    def _exactIndex(self, locations):
+        '''Indices of the sampling values that are equal to `locations`.
+        The sampling values form a dense range of integers, so that the
+        index is the offset from the first sampling value'''
+        x = self.x
+        ix = np.subtract(locations, x[0]).astype(np.intp)
+        if np.any((ix < 0) | (ix >= len(x))) or np.any(x[ix] != locations):
+            raise ValueError('%s: update location is not one of the '
+                             'sampling values'%self.__class__.__name__)
+        return ix
 
     def _updateInternalSamplingScore(self, amount, location, width):
         if width == 0:
-            ix = self.x.index(location)
-            self._scores[ix] += amount
+            self._scores[self._exactIndex(location)] += amount
         else:
             QuantitativeVariableBase._updateInternalSamplingScore(self, amount, location, width)
 
+    def _updateInternalSamplingScoreBatch(self, amounts, locations, width):
+        if width == 0:
+            ix = self._exactIndex(locations)
+            self._scores += np.bincount(ix, weights=amounts,
+                                        minlength=len(self.x))
+        else:
+            QuantitativeVariableBase._updateInternalSamplingScoreBatch(
+                self, amounts, locations, width)
 
 
     def _createRNG(self):
-        rng = randomArbitrary.RandomArbitraryInteger(self.x, self.pdfValues)
+        rng = self.SAMPLERS[self.sampler](self.x, self.pdfValues, self.dtype)
         return rng
 
     @staticmethod
@@ -451,11 +980,40 @@ class IntegerVariable(QuantitativeVariableBase):
 
 
 
+class SparseIntegerVariable(IntegerVariable):
+    '''Integer variable that is limited to the given sampling values
+
+    Unlike `IntegerVariable`, the integers between the sampling values are
+    not added to the grid. The variable is sampled and updated over the
+    given values only, so that its size does not depend on their range.
+    This suits domains such as powers of two:
+        SparseIntegerVariable(2 ** np.arange(31))
+    Kernel updates treat the values as an unequally spaced grid. Exact
+    (zero-width) updates locate their values by binary search.
+    '''
+    __slots__ = ()
+
+    @classmethod
+    def _prepareSamplingValuesAndScores(cls, x, scores):
+        return (x, scores)
+
+    def _exactIndex(self, locations):
+        '''Indices of the sampling values that are equal to `locations`'''
+        x = self.x
+        ix = np.searchsorted(x, locations)
+        if np.any(ix == len(x)) or np.any(x[ix] != locations):
+            raise ValueError('%s: update location is not one of the '
+                             'sampling values'%self.__class__.__name__)
+        return ix
+
+
+
 
 class QualitativeVariableBase(VariableBase):
     '''Abstract class for every qualitative variable type'''
     #This variable type isn't supported yet
     __metaclass__ = ABCMeta
+    __slots__ = ()
     def __init__(self, samplingValues, samplingScores=None,
                  name=None,
                  **kwparam):
@@ -463,6 +1021,112 @@ class QualitativeVariableBase(VariableBase):
 
 
 
+#slots with one value per sampling value, that `packVariables` stacks
+STACKED_SLOTS = ('_scores', '_pdfValues')
+
+#types whose equal values are stored once per group by `packVariables`
+_SCALAR_TYPES = (int, long, float, complex, bool, str, unicode, np.generic,
+                 np.dtype)
+
+
+def _isConstant(values):
+    '''True if all the values are the first one, or equal scalars'''
+    first = values[0]
+    if isinstance(first, _SCALAR_TYPES):
+        return all((v is first) or ((type(v) is type(first)) and (v == first))
+                   for v in values)
+    return all(v is first for v in values)
+
+
+class PackedVariables(object):
+    '''Compact picklable form of a list of variables, see `packVariables`
+
+    Attributes:
+    n: the number of variables
+    groups: list of (class, indices, stacked, constants, columns) tuples.
+        `stacked` maps every slot of `STACKED_SLOTS` to a 2-D array with
+        one row per variable, `constants` maps slots to the value that all
+        the variables share and `columns` maps the other slots to lists of
+        values
+    others: list of (index, object) pairs of the objects that are not
+        `VariableBase` instances
+    '''
+
+    def __init__(self, n, groups, others):
+        self.n = n
+        self.groups = groups
+        self.others = others
+
+
+def packVariables(variables):
+    '''Pack variables for pickling
+
+    The variables of the same class, with the same number of sampling
+    values and the same type of scores and probability density form a
+    group. The arrays of `STACKED_SLOTS` of a group are stacked into 2-D
+    arrays, that a checkpoint writes as single blocks (see `checkpoint`).
+    A slot that holds the same object (e.g. a shared grid) or equal scalars
+    in all the variables of a group is stored once. Thus, the size of the
+    pickle does not grow with the number of variables.
+    @param variables: sequence of variables. Objects that are not
+        `VariableBase` instances are kept as they are
+    @return: `PackedVariables` object, see `unpackVariables`
+    '''
+
+    groups = {}
+    others = []
+    for (i, v) in enumerate(variables):
+        if not isinstance(v, VariableBase):
+            others.append((i, v))
+            continue
+        key = (type(v), len(v._x)) + \
+            tuple(getattr(v, slot).dtype.str for slot in STACKED_SLOTS)
+        groups.setdefault(key, []).append(i)
+
+    packed = []
+    for (key, indices) in groups.items():
+        states = [variables[i].__getstate__() for i in indices]
+        stacked = {}
+        for slot in STACKED_SLOTS:
+            stacked[slot] = np.array([s.pop(slot) for s in states])
+        (constants, columns) = ({}, {})
+        for slot in states[0]:
+            values = [s.get(slot) for s in states]
+            if _isConstant(values):
+                constants[slot] = values[0]
+            else:
+                columns[slot] = values
+        packed.append((key[0], indices, stacked, constants, columns))
+    return PackedVariables(len(variables), packed, others)
+
+
+def unpackVariables(packed):
+    '''The list of variables packed by `packVariables`
+
+    The arrays of `STACKED_SLOTS` of every variable are views of the rows
+    of the stacked arrays. The sampler tables are rebuilt on first use.
+    @param packed: `PackedVariables` object. A list is returned as it is
+    '''
+
+    if not isinstance(packed, PackedVariables):
+        return packed
+    variables = [None] * packed.n
+    for (cls, indices, stacked, constants, columns) in packed.groups:
+        for (row, i) in enumerate(indices):
+            state = constants.copy()
+            for (slot, values) in columns.items():
+                state[slot] = values[row]
+            for (slot, block) in stacked.items():
+                state[slot] = block[row]
+            v = cls.__new__(cls)
+            v.__setstate__(state)
+            variables[i] = v
+    for (i, v) in packed.others:
+        variables[i] = v
+    return variables
+
+
+
 
 if __name__ == '__main__':
     pass
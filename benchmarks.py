@@ -0,0 +1,346 @@
+'''
+Microbenchmarks of ASOP internals
+
+Times the building blocks of an optimization iteration (`ASOP.sample`,
+`ASOP.learn`, `VariableBase.applySamplingScore`,
+`alterSamplingDistribution`, `inverseLogit` and the scaling functions)
+over sweeps of population size, number of dimensions and grid size.
+
+Every case runs in a separate process, so that its peak memory can be
+measured and earlier cases do not affect it. For every case, the number
+of calls per measurement is increased until a measurement takes at least
+`--min-time` seconds. The measurement is then repeated `--repeat` times.
+The results are written as a JSON document: environment information and
+one record per case with the per-call times (best and median, seconds)
+and the peak resident memory of the process (bytes).
+
+Usage:
+    python benchmarks.py [--quick] [--output results.json]
+                         [--filter learn] [--compare baseline.json]
+
+With `--compare`, every case is also compared to the same case of an
+earlier results file, e.g. the results of another version of ASOP
+on the same machine.
+'''
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+
+import numpy as np
+
+try:
+    import resource
+except ImportError: #not available on Windows
+    resource = None
+
+import asop
+from asop import scaling, variableTypes
+
+SWEEPS = {
+    'full': {
+        'size': (100, 1000, 10000),
+        'dimensions': (1, 10, 100),
+        'grid': (100, 1000, 10000),
+        'learning': asop.asop.LEARNING_MODES,
+        'truncation': (None, 4),
+    },
+    'quick': {
+        'size': (100, 1000),
+        'dimensions': (2, 10),
+        'grid': (100, 1000),
+        'learning': asop.asop.LEARNING_MODES,
+        'truncation': (None, 4),
+    },
+}
+
+#kernel learning cases that would evaluate more kernel values than this
+#number per call are skipped
+MAX_KERNEL_VALUES = 2e8
+
+
+def _createOptimizer(dimensions, grid, learning='batch'):
+    x = variableTypes.sharedGrid(np.linspace(-2, 2, grid))
+    variables = [variableTypes.ContinuousVariable(x, samplingStd=.1)
+                 for i in range(dimensions)] #@UnusedVariable
+    return asop.ASOP(None, variables, scaling='auto', learning=learning)
+
+
+def benchSample(size, dimensions, grid):
+    optimizer = _createOptimizer(dimensions, grid)
+    return lambda: optimizer.sample(size, asArray=True)
+
+
+def benchLearn(size, dimensions, grid, learning):
+    optimizer = _createOptimizer(dimensions, grid, learning)
+    s = optimizer.sample(size, asArray=True)
+    values = np.sum(s ** 2, axis=1)
+    return lambda: optimizer.learn(s, values)
+
+
+def benchApplySamplingScore(grid):
+    variable = variableTypes.ContinuousVariable(np.linspace(-2, 2, grid),
+                                                samplingStd=.1)
+    def run():
+        #the scores are reset by every apply. Their values do not change
+        #the amount of work
+        variable.applySamplingScore()
+    return run
+
+
+def benchAlterSamplingDistribution(grid, truncation):
+    variable = variableTypes.ContinuousVariable(np.linspace(-2, 2, grid),
+                                                samplingStd=.1,
+                                                kernelTruncation=truncation)
+    return lambda: variable.alterSamplingDistribution(1.0, 0.3, .1,
+                                                      immediateApply=False)
+
+
+def benchInverseLogit(size):
+    z = np.random.randn(size) * 10
+    out = np.empty_like(z)
+    return lambda: variableTypes.inverseLogit(z, out=out)
+
+
+def benchScalingFromValueExtrema(size):
+    values = np.random.randn(size)
+    return lambda: scaling.tanhScalingFromValueExtrema(values, 0.8)
+
+
+def benchTanhScaling(size):
+    values = np.random.randn(size)
+    func = scaling.TanhScaling(0.0, 2.0)
+    return lambda: func(values)
+
+
+def benchLinearScaling(size):
+    values = np.random.randn(size)
+    func = scaling.LinearScaling(2.0, 1.0)
+    return lambda: func(values)
+
+
+def benchLogisticScaling(size):
+    values = np.random.randn(size)
+    func = scaling.LogisticScaling(0.0, 2.0)
+    return lambda: func(values)
+
+
+#(name, setup function, swept parameters). A setup function receives the
+#parameters of a case and returns the callable to time
+BENCHMARKS = [
+    ('ASOP.sample', benchSample, ('size', 'dimensions', 'grid')),
+    ('ASOP.learn', benchLearn, ('size', 'dimensions', 'grid', 'learning')),
+    ('applySamplingScore', benchApplySamplingScore, ('grid', )),
+    ('alterSamplingDistribution', benchAlterSamplingDistribution,
+     ('grid', 'truncation')),
+    ('inverseLogit', benchInverseLogit, ('size', )),
+    ('tanhScalingFromValueExtrema', benchScalingFromValueExtrema,
+     ('size', )),
+    ('TanhScaling', benchTanhScaling, ('size', )),
+    ('LinearScaling', benchLinearScaling, ('size', )),
+    ('LogisticScaling', benchLogisticScaling, ('size', )),
+]
+
+
+def isFeasible(name, parameters):
+    '''False for the cases that are too slow to be measured'''
+    if (name == 'ASOP.learn') and (parameters['learning'] != 'histogram'):
+        kernelValues = parameters['size'] * parameters['dimensions'] * \
+            parameters['grid']
+        return kernelValues <= MAX_KERNEL_VALUES
+    return True
+
+
+def cases(sweep, pattern=None):
+    '''(name, parameters) of every case of the sweep, optionally only of
+    the benchmarks whose names contain `pattern`'''
+
+    for (name, setup, keys) in BENCHMARKS: #@UnusedVariable
+        if pattern and (pattern not in name):
+            continue
+        for values in itertools.product(*[sweep[k] for k in keys]):
+            parameters = dict(zip(keys, values))
+            if isFeasible(name, parameters):
+                yield (name, parameters)
+
+
+def peakMemory():
+    '''Peak resident memory of this process in bytes, None if unknown'''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak #reported in bytes
+    return peak * 1024 #reported in kilobytes
+
+
+def measure(func, repeat, minTime):
+    '''Per-call times of `func`
+
+    @return: tuple (loops, times). `times` are `repeat` per-call times,
+        each measured over `loops` calls
+    '''
+
+    func() #warm up
+    loops = 1
+    while True:
+        start = timeit.default_timer()
+        for i in xrange(loops): #@UnusedVariable
+            func()
+        elapsed = timeit.default_timer() - start
+        if elapsed >= minTime:
+            break
+        loops = max(loops * 2, int(loops * 1.2 * minTime / max(elapsed,
+                                                              1e-9)))
+    times = [elapsed / loops]
+    for r in range(repeat - 1): #@UnusedVariable
+        start = timeit.default_timer()
+        for i in xrange(loops): #@UnusedVariable
+            func()
+        times.append((timeit.default_timer() - start) / loops)
+    return (loops, times)
+
+
+def runCase(name, parameters, repeat, minTime):
+    '''Measure a single case in the current process'''
+
+    setup = dict((b[0], b[1]) for b in BENCHMARKS)[name]
+    np.random.seed(0)
+    baseline = peakMemory()
+    func = setup(**parameters)
+    (loops, times) = measure(func, repeat, minTime)
+    return {'benchmark': name, 'parameters': parameters, 'loops': loops,
+            'times': times, 'best': min(times),
+            'median': float(np.median(times)),
+            'baselineMemory': baseline, 'peakMemory': peakMemory()}
+
+
+def _runCaseInChild(connection, name, parameters, repeat, minTime):
+    try:
+        result = runCase(name, parameters, repeat, minTime)
+    except Exception as e:
+        result = {'benchmark': name, 'parameters': parameters,
+                  'error': '%s: %s'%(e.__class__.__name__, e)}
+    connection.send(result)
+    connection.close()
+
+
+def runIsolated(name, parameters, repeat, minTime):
+    '''Measure a single case in a new process'''
+
+    (receiver, sender) = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(target=_runCaseInChild,
+                                      args=(sender, name, parameters, repeat,
+                                            minTime))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = {'benchmark': name, 'parameters': parameters,
+                  'error': 'the benchmark process died'}
+    process.join()
+    return result
+
+
+def environment():
+    '''Description of the machine and of the software versions'''
+
+    try:
+        with open(os.devnull, 'w') as devnull:
+            revision = subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'], stderr=devnull,
+                cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpus': multiprocessing.cpu_count(),
+            'revision': revision}
+
+
+def caseKey(record):
+    return (record['benchmark'],
+            tuple(sorted(record['parameters'].items())))
+
+
+def formatCase(record):
+    parameters = ', '.join('%s=%s'%p
+                           for p in sorted(record['parameters'].items()))
+    return '%s(%s)'%(record['benchmark'], parameters)
+
+
+def compare(results, baseline):
+    '''Print the ratio of the best time of every case to the best time of
+    the same case in `baseline`'''
+
+    reference = dict((caseKey(r), r) for r in baseline['results']
+                     if 'best' in r)
+    for record in results['results']:
+        old = reference.get(caseKey(record))
+        if (old is None) or ('best' not in record):
+            continue
+        ratio = record['best'] / old['best']
+        print >> sys.stderr, '%-70s %8.3fx%s'%(
+            formatCase(record), ratio,
+            ' slower' if ratio > 1 else ' faster')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--quick', action='store_true',
+                        help='small sweep, for a fast check')
+    parser.add_argument('--filter', default=None,
+                        help='run the benchmarks whose names contain this '
+                        'string only')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='measurements per case (default: 5)')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='minimal duration of a measurement, seconds '
+                        '(default: 0.2)')
+    parser.add_argument('--inline', action='store_true',
+                        help='run the cases in this process. Faster, but '
+                        'the peak memory is that of the whole run')
+    parser.add_argument('--output', default=None,
+                        help='JSON results file (default: standard output)')
+    parser.add_argument('--compare', default=None,
+                        help='JSON results file of an earlier run')
+    args = parser.parse_args(argv)
+
+    sweep = SWEEPS['quick' if args.quick else 'full']
+    run = runCase if args.inline else runIsolated
+    results = {'environment': environment(),
+               'sweep': 'quick' if args.quick else 'full', 'results': []}
+    for (name, parameters) in cases(sweep, args.filter):
+        record = run(name, parameters, args.repeat, args.min_time)
+        results['results'].append(record)
+        if 'error' in record:
+            print >> sys.stderr, '%-70s %s'%(formatCase(record),
+                                             record['error'])
+        else:
+            print >> sys.stderr, '%-70s %12.6fs'%(formatCase(record),
+                                                  record['best'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=1, sort_keys=True)
+        print
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return results
+
+
+if __name__ == '__main__':
+    main()
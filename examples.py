@@ -26,6 +26,33 @@ def sines2Dfunc((x, y)):
     return 1.0 + np.sin(x)**2 + np.sin(y)**2 - 0.1 * np.exp(-(x**2) - (y**2))
 
 
+def vectorizedRosenbrock(X):
+    '''N-D Rosenbrock function of every row of X
+
+    Rosenbrock(x) = sum_i (1 - x_i)^2 + 100(x_{i+1} - x_i^2)^2
+    For two columns it is identical to `rosenbrock`
+    '''
+    X = np.asarray(X)
+    head = X[:, :-1]
+    tail = X[:, 1:]
+    return np.sum((1 - head) ** 2 + 100 * (tail - head ** 2) ** 2, axis=1)
+
+def vectorizedRastrigin(X):
+    '''N-D version of `rastrigin` for every row of X
+
+    rastrigin(x) = 10D + sum_i x_i^2 + 10cos(2pi * x_i)
+    '''
+    X = np.asarray(X)
+    return 10.0 * X.shape[1] + \
+        np.sum(X ** 2 + 10.0 * np.cos(2 * np.pi * X), axis=1)
+
+def vectorizedSinesFunc(X):
+    '''N-D version of `sines2Dfunc` for every row of X'''
+    X = np.asarray(X)
+    return 1.0 + np.sum(np.sin(X) ** 2, axis=1) - \
+        0.1 * np.exp(-np.sum(X ** 2, axis=1))
+
+
 def humpFunction(v):
     '''Hump test function
 
@@ -150,6 +177,181 @@ def demoOptimizeFunction2params(TIMES, SIZE,
     return (optimizer, z)
 
 
+def benchmarkVectorizedObjective(SIZE=100000, TIMES=3):
+    '''Compare one-tuple-per-call and vectorized evaluation in `train`
+
+    Trains two identical 2-D optimizers on each of the example functions,
+    one that calls the function once per solution and one that
+    evaluates the whole population as a single array. The histogram
+    learning mode is used so that learning does not mask the
+    evaluation time.
+
+    Returns
+    -----------------
+    dictionary that maps function name to a (per-tuple seconds,
+    vectorized seconds) tuple. The times are the best of `TIMES` calls
+    to `train(SIZE)`
+    '''
+    import time
+
+    pairs = ((rosenbrock, vectorizedRosenbrock),
+             (rastrigin, vectorizedRastrigin),
+             (sines2Dfunc, vectorizedSinesFunc))
+    ret = {}
+    for (func, vectorizedFunc) in pairs:
+        lTimes = []
+        for (f, vectorized) in ((func, False), (vectorizedFunc, True)):
+            dimensions = [asop.variableTypes.ContinuousVariable(
+                              np.linspace(-2, 2, 1000), samplingStd=.05)
+                          for i in range(2)] #@UnusedVariable
+            optimizer = asop.ASOP(f, dimensions, scaling='auto',
+                                  learning='histogram',
+                                  vectorized=vectorized)
+            best = None
+            for t in range(TIMES): #@UnusedVariable
+                start = time.time()
+                optimizer.train(SIZE)
+                elapsed = time.time() - start
+                best = elapsed if best is None else min(best, elapsed)
+            lTimes.append(best)
+        ret[func.__name__] = tuple(lTimes)
+        print '%s: per-tuple %.3fs, vectorized %.3fs'%(func.__name__,
+                                                      lTimes[0], lTimes[1])
+    return ret
+
+
+def benchmarkIntegerSamplers(SIZES=(1000, 10000, 100000),
+                             DRAWS_PER_VALUE=(0.01, 0.1, 1, 10, 100),
+                             TIMES=3):
+    '''Compare the samplers of `IntegerVariable`
+
+    For every number of sampling values G, a random distribution is
+    loaded into both samplers (`set_pdf`, done by every
+    `applySamplingScore`) and then sampled N times, for N equal to G times
+    every value in `DRAWS_PER_VALUE`. The alias table pays off when N is
+    large enough for its cheaper draws to cover its costlier rebuild.
+
+    Returns
+    -----------------
+    dictionary that maps (G, N) to a (cdf seconds, alias seconds) tuple.
+    The times are the best of `TIMES` set_pdf + random(N) calls
+    '''
+    import time
+    from asop import sampling
+
+    ret = {}
+    for G in SIZES:
+        x = np.arange(G)
+        pdf = np.random.random_sample(G) ** 4
+        samplers = (sampling.DiscreteSampler(x, pdf),
+                    sampling.AliasSampler(x, pdf))
+        for ratio in DRAWS_PER_VALUE:
+            N = max(1, int(G * ratio))
+            lTimes = []
+            for sampler in samplers:
+                best = None
+                for t in range(TIMES): #@UnusedVariable
+                    start = time.time()
+                    sampler.set_pdf(x, pdf)
+                    sampler.random(N)
+                    elapsed = time.time() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                lTimes.append(best)
+            ret[(G, N)] = tuple(lTimes)
+            print 'G=%d, N=%d: cdf %.4fs, alias %.4fs'%(G, N, lTimes[0],
+                                                        lTimes[1])
+    return ret
+
+
+def vectorizedSphere(X):
+    return np.sum(np.square(X), axis=1)
+
+
+def benchmarkSinglePrecision(GRID=10000, DIMENSIONS=100, SIZE=1000,
+                             TIMES=3):
+    '''Compare the double and single precision state of the dimensions
+
+    Trains two identical optimizers of the vectorized sphere function,
+    with `DIMENSIONS` continuous dimensions over a `GRID`-point grid each,
+    one with float64 and one with float32 state.
+
+    Returns
+    -----------------
+    dictionary that maps the type name to a (state bytes, seconds) tuple.
+    State bytes are the bytes of the grids, scores, densities, work arrays
+    and sampler tables of all the dimensions. The time is the best of
+    `TIMES` calls to `train(SIZE)`
+    '''
+    import time
+
+    ret = {}
+    for dtype in (np.float64, np.float32):
+        grid = asop.variableTypes.sharedGrid(np.linspace(-2, 2, GRID),
+                                             dtype)
+        dimensions = [asop.variableTypes.ContinuousVariable(grid,
+                                                            samplingStd=.05)
+                      for i in range(DIMENSIONS)] #@UnusedVariable
+        optimizer = asop.ASOP(vectorizedSphere, dimensions, scaling='auto',
+                              learning='batch', vectorized=True,
+                              dtype=dtype)
+        nBytes = grid.nbytes
+        for d in dimensions:
+            nBytes += sum(a.nbytes for a in (d.scores, d.pdfValues,
+                                             d._workScores,
+                                             d._workProbability,
+                                             d._rng._cdf, d._rng._slope))
+        best = None
+        for t in range(TIMES): #@UnusedVariable
+            start = time.time()
+            optimizer.train(SIZE)
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        ret[np.dtype(dtype).name] = (nBytes, best)
+        print '%s: %.1f MB of state, %.3fs'%(np.dtype(dtype).name,
+                                            nBytes / 2.0 ** 20, best)
+    return ret
+
+
+def benchmarkCheckpoint(DIMENSIONS=10000, GRID=1000, SIZE=100,
+                        filename='benchmark.ckpt'):
+    '''Time `ASOP.save` and `ASOP.load` of a large optimizer
+
+    The optimizer has `DIMENSIONS` continuous dimensions over a common
+    `GRID`-point grid and is trained once with `SIZE` solutions.
+
+    Returns
+    -----------------
+    dictionary with the file size in bytes and the save, load and
+    memory-mapped load times in seconds
+    '''
+    import os
+    import time
+
+    grid = asop.variableTypes.sharedGrid(np.linspace(-2, 2, GRID))
+    dimensions = [asop.variableTypes.ContinuousVariable(grid, samplingStd=.05)
+                  for i in range(DIMENSIONS)] #@UnusedVariable
+    optimizer = asop.ASOP(vectorizedSphere, dimensions, scaling='auto',
+                          learning='batch', vectorized=True)
+    optimizer.train(SIZE)
+    ret = {}
+    try:
+        start = time.time()
+        optimizer.save(filename)
+        ret['save'] = time.time() - start
+        ret['bytes'] = os.path.getsize(filename)
+        for mmap in (False, True):
+            start = time.time()
+            asop.ASOP.load(filename, vectorizedSphere, mmap=mmap)
+            ret['load (mmap)' if mmap else 'load'] = time.time() - start
+    finally:
+        if os.path.exists(filename):
+            os.remove(filename)
+    print '%.1f MB: save %.3fs, load %.3fs, mmap load %.3fs'%(
+        ret['bytes'] / 2.0 ** 20, ret['save'], ret['load'],
+        ret['load (mmap)'])
+    return ret
+
+
 if __name__ == '__main__':
     from matplotlib import pylab as plt
     for (ixF, func) in enumerate((rastrigin, rosenbrock, sines2Dfunc)):
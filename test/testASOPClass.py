@@ -1,8 +1,16 @@
 
 import unittest
+import os
+import shutil
+import socket
+import tempfile
+import SocketServer
+import threading
+import time
 import asop
 ASOP = asop.ASOP
 import numpy as np
+from multiprocessing.pool import ThreadPool
 
 
 class TestInstatination(unittest.TestCase):
@@ -126,6 +134,709 @@ class TestFunctionality(unittest.TestCase):
 
 
 
+class TestLearningModes(unittest.TestCase):
+    '''All the learning modes should result in the same distributions'''
+
+    @staticmethod
+    def func((x, y)):
+        return x ** 2 + y ** 2
+
+    def createOptimizer(self, learning):
+        dimensions = [asop.variableTypes.ContinuousVariable(
+                          np.linspace(-2, 2, 200), samplingStd=.1)
+                      for i in range(2)] #@UnusedVariable
+        return ASOP(self.func, dimensions, scaling='auto', learning=learning)
+
+    def assertSameDistributions(self, optimizer, reference, places=8):
+        for (d, dRef) in zip(optimizer.dimensions, reference.dimensions):
+            diff = np.sum(np.square(np.subtract(d.pdfValues,
+                                                dRef.pdfValues)))
+            self.assertAlmostEqual(diff, 0, places)
+
+    def testBatchEqualsSequential(self):
+        reference = self.createOptimizer('sequential')
+        solutions = reference.sample(500)
+        values = map(self.func, solutions)
+        reference.learn(solutions, values)
+        optimizer = self.createOptimizer('batch')
+        optimizer.learn(solutions, values)
+        self.assertSameDistributions(optimizer, reference)
+
+    def testHistogramEqualsSequentialOnGrid(self):
+        '''No binning error when the solutions are sampling values'''
+        reference = self.createOptimizer('sequential')
+        grid = reference.dimensions[0].x
+        solutions = [(grid[i], grid[j]) for (i, j) in
+                     np.random.randint(0, len(grid), (500, 2))]
+        values = map(self.func, solutions)
+        reference.learn(solutions, values)
+        optimizer = self.createOptimizer('histogram')
+        optimizer.learn(solutions, values)
+        self.assertSameDistributions(optimizer, reference)
+
+    def testHistogramIsCloseToSequential(self):
+        reference = self.createOptimizer('sequential')
+        solutions = [tuple(s) for s in np.random.uniform(-2, 2, (500, 2))]
+        values = map(self.func, solutions)
+        reference.learn(solutions, values)
+        optimizer = self.createOptimizer('histogram')
+        optimizer.learn(solutions, values)
+        self.assertSameDistributions(optimizer, reference, 4)
+
+    def testInvalidLearningMode(self):
+        self.assertRaises(AssertionError, self.createOptimizer, 'nonsense')
+
+    def testSequentialIsTheDefault(self):
+        self.assertEqual(ASOP(self.func).learning, 'sequential')
+
+    def testScalarScalingFunction(self):
+        '''A scaling function that raises on arrays is called per value'''
+        def scalarScaling(value):
+            if not isinstance(value, float):
+                raise TypeError('a float is required')
+            return np.tanh(value - 2.0)
+        reference = self.createOptimizer('sequential')
+        reference.scaling = scalarScaling
+        solutions = reference.sample(200)
+        values = map(self.func, solutions)
+        reference.learn(solutions, values)
+        optimizer = self.createOptimizer('batch')
+        optimizer.scaling = scalarScaling
+        optimizer.learn(solutions, values)
+        self.assertSameDistributions(optimizer, reference)
+
+
+
+
+def sumOfSquares(solution):
+    #module-level, so that it can be sent to a process pool
+    return sum(v ** 2 for v in solution)
+
+
+class TestParallelEvaluation(unittest.TestCase):
+    '''Parallel evaluation should keep the order of the solutions'''
+
+    def testExecutorsKeepOrder(self):
+        sample = [tuple(s) for s in np.random.uniform(-2, 2, (1000, 3))]
+        expected = map(sumOfSquares, sample)
+        for executor in (None, 'thread', 'process'):
+            optimizer = ASOP(sumOfSquares, 3, executor=executor, workers=3,
+                             chunksize=7)
+            try:
+                self.assertEqual(optimizer._evaluate(sample), expected)
+            finally:
+                optimizer.close()
+
+    def testCustomExecutor(self):
+        pool = ThreadPool(2)
+        try:
+            optimizer = ASOP(sumOfSquares, 2, executor=pool, scaling='auto')
+            ret = optimizer.train(200, 5)
+            self.assertEqual(len(ret), 5)
+            for (s, v) in ret:
+                self.assertEqual(v, sumOfSquares(s))
+            optimizer.close()
+            #the pool was supplied by the user, so it should still work
+            self.assertEqual(pool.map(abs, [-1, -2]), [1, 2])
+        finally:
+            pool.close()
+
+    def testInvalidExecutor(self):
+        self.assertRaises(AssertionError, ASOP, sumOfSquares, 2,
+                          executor='nonsense')
+
+
+
+
+class TestVectorizedObjective(unittest.TestCase):
+
+    @staticmethod
+    def func(X):
+        return np.sum(np.square(X), axis=1)
+
+    def testTrainReturnsCorrectValues(self):
+        for executor in (None, 'thread'):
+            optimizer = ASOP(self.func, 3, scaling='auto', vectorized=True,
+                             executor=executor, chunksize=33)
+            ret = optimizer.train(500, 500)
+            optimizer.close()
+            self.assertEqual(len(ret), 500)
+            for (s, v) in ret:
+                self.assertEqual(len(s), 3)
+                self.assertAlmostEqual(v, np.sum(np.square(s)))
+
+    def testWrongNumberOfValues(self):
+        optimizer = ASOP(lambda X: np.zeros(3), 2, vectorized=True)
+        self.assertRaises(AssertionError, optimizer.train, 10)
+
+
+
+
+class TestAskTell(unittest.TestCase):
+
+    @staticmethod
+    def func(solution):
+        return sum(v ** 2 for v in solution)
+
+    def createOptimizer(self, **kwparam):
+        dimensions = [asop.variableTypes.ContinuousVariable(
+                          np.linspace(-2, 2, 100), samplingStd=.1)
+                      for i in range(2)] #@UnusedVariable
+        return ASOP(None, dimensions, **kwparam)
+
+    def testTrainIsDisabledWithoutFunc(self):
+        optimizer = self.createOptimizer()
+        self.assertRaises(AssertionError, optimizer.train, 10)
+
+    def testOutOfOrderPartialTell(self):
+        optimizer = self.createOptimizer(scaling='auto')
+        (ids, solutions) = optimizer.ask(50)
+        self.assertEqual(len(set(ids)), 50)
+        self.assertEqual(optimizer.nPending, 50)
+        order = np.random.permutation(50)
+        values = [self.func(solutions[i]) for i in order]
+        pdfBefore = np.array(optimizer.dimensions[0].pdfValues)
+        self.assertTrue(optimizer.tell([ids[i] for i in order[:10]],
+                                       values[:10]))
+        self.assertEqual(optimizer.nPending, 40)
+        pdfAfter = np.array(optimizer.dimensions[0].pdfValues)
+        self.assertFalse(np.allclose(pdfBefore, pdfAfter))
+        self.assertTrue(optimizer.tell([ids[i] for i in order[10:]],
+                                       values[10:]))
+        self.assertEqual(optimizer.nPending, 0)
+
+    def testTellBatchSize(self):
+        optimizer = self.createOptimizer(tellBatchSize=10)
+        (ids, solutions) = optimizer.ask(15)
+        values = map(self.func, solutions)
+        self.assertFalse(optimizer.tell(ids[:5], values[:5]))
+        self.assertTrue(optimizer.tell(ids[5:10], values[5:10]))
+        self.assertFalse(optimizer.tell(ids[10:], values[10:]))
+        optimizer.flush()
+
+    def testUnknownIds(self):
+        optimizer = self.createOptimizer()
+        (ids, solutions) = optimizer.ask(3)
+        optimizer.tell(ids[:1], [1.0])
+        self.assertRaises(KeyError, optimizer.tell, ids[:1], [1.0])
+        self.assertRaises(KeyError, optimizer.tell, [ids[-1] + 1], [1.0])
+
+
+
+
+class SlowSquareHandler(SocketServer.StreamRequestHandler):
+    '''Stub simulation service: replies with the sum of squares of the
+    numbers in the request line, after a delay'''
+
+    DELAY = 0.05
+
+    def handle(self):
+        solution = [float(v) for v in self.rfile.readline().split()]
+        time.sleep(self.DELAY)
+        self.wfile.write('%r\n'%sum(v ** 2 for v in solution))
+
+
+class StubServer(SocketServer.ThreadingTCPServer):
+    daemon_threads = True
+    #the default backlog of 5 drops simultaneous connections
+    request_queue_size = 64
+
+
+class TestConcurrentTraining(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer(('127.0.0.1', 0), SlowSquareHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def func(self, solution):
+        connection = socket.create_connection(self.server.server_address)
+        try:
+            connection.sendall(' '.join(repr(float(v))
+                                        for v in solution) + '\n')
+            return float(connection.makefile().readline())
+        finally:
+            connection.close()
+
+    def testConcurrencyGain(self):
+        N = 32
+        CONCURRENCY = 8
+        optimizer = ASOP(self.func, 2, scaling='auto')
+        start = time.time()
+        ret = optimizer.trainConcurrently(N, N, concurrency=CONCURRENCY)
+        elapsed = time.time() - start
+        self.assertEqual(len(ret), N)
+        for (s, v) in ret:
+            self.assertAlmostEqual(v, sum(x ** 2 for x in s))
+        self.assertEqual(optimizer.nPending, 0)
+        serial = N * SlowSquareHandler.DELAY
+        self.assertTrue(elapsed < serial / 2.0,
+                        '%d evaluations took %.2fs'%(N, elapsed))
+
+    def testErrorsPropagate(self):
+        def func(solution):
+            raise RuntimeError('failed evaluation')
+        optimizer = ASOP(func, 2)
+        self.assertRaises(RuntimeError, optimizer.trainConcurrently, 10)
+        self.assertEqual(optimizer.nPending, 0)
+
+
+
+
+class TestArraySamples(unittest.TestCase):
+
+    @staticmethod
+    def func(solution):
+        return sum(float(v) ** 2 for v in solution)
+
+    def testHomogeneousDimensions(self):
+        optimizer = ASOP(self.func, 3)
+        s = optimizer.sample(100, asArray=True)
+        self.assertEqual(s.shape, (100, 3))
+        self.assertEqual(s.dtype, float)
+
+    def testMixedDimensions(self):
+        dimensions = [asop.variableTypes.ContinuousVariable(
+                          np.linspace(-2, 2, 50), name='a'),
+                      asop.variableTypes.IntegerVariable(range(-5, 6),
+                                                         name='b')]
+        for learning in asop.asop.LEARNING_MODES:
+            optimizer = ASOP(self.func, dimensions, scaling='auto',
+                             learning=learning)
+            s = optimizer.sample(100, asArray=True)
+            self.assertEqual(s.shape, (100,))
+            self.assertEqual(s.dtype.names, ('a', 'b'))
+            self.assertEqual(s['a'].dtype.kind, 'f')
+            self.assertEqual(s['b'].dtype.kind, 'i')
+            self.assertTrue(np.all(np.in1d(s['b'], range(-5, 6))))
+            optimizer.learn(s, [self.func(r) for r in s.tolist()])
+            ret = optimizer.train(100, 3)
+            self.assertEqual(len(ret), 3)
+
+    def testArrayAndTuplesLearnTheSame(self):
+        dimensions = lambda: [asop.variableTypes.ContinuousVariable(
+                                  np.linspace(-2, 2, 50))
+                              for i in range(2)] #@UnusedVariable
+        optimizerArray = ASOP(self.func, dimensions(), scaling='auto')
+        optimizerTuples = ASOP(self.func, dimensions(), scaling='auto')
+        s = optimizerArray.sample(200, asArray=True)
+        values = [self.func(r) for r in s]
+        optimizerArray.learn(s, values)
+        optimizerTuples.learn([tuple(r) for r in s], values)
+        for (d1, d2) in zip(optimizerArray.dimensions,
+                            optimizerTuples.dimensions):
+            self.assertTrue(np.allclose(d1.pdfValues, d2.pdfValues))
+
+
+
+class TestSinglePrecision(unittest.TestCase):
+
+    @staticmethod
+    def func(solution):
+        return sum(float(v) ** 2 for v in solution)
+
+    def createOptimizer(self, learning, dtype):
+        dimensions = [asop.variableTypes.ContinuousVariable(
+                          np.linspace(-2, 2, 100), samplingStd=.1),
+                      asop.variableTypes.IntegerVariable(range(-5, 6))]
+        return ASOP(self.func, dimensions, scaling='auto', learning=learning,
+                    dtype=dtype)
+
+    def testSameDistributionsAsDoublePrecision(self):
+        for learning in asop.asop.LEARNING_MODES:
+            single = self.createOptimizer(learning, np.float32)
+            double = self.createOptimizer(learning, None)
+            for i in range(20): #@UnusedVariable
+                s = double.sample(100)
+                values = map(self.func, s)
+                double.learn(s, values)
+                single.learn(s, values)
+            for (d1, d2) in zip(single.dimensions, double.dimensions):
+                self.assertEqual(d1.pdfValues.dtype, np.float32)
+                self.assertTrue(np.allclose(d1.pdfValues, d2.pdfValues,
+                                            rtol=1e-3, atol=1e-6))
+            self.assertEqual(len(single.train(100, 3)), 3)
+
+    def testSharedGridStaysShared(self):
+        grid = asop.variableTypes.sharedGrid(np.linspace(-2, 2, 100))
+        other = asop.variableTypes.sharedGrid(np.linspace(-1, 1, 100))
+        dimensions = [asop.variableTypes.ContinuousVariable(g, samplingStd=.1)
+                      for g in (grid, grid, other, grid, other)]
+        optimizer = ASOP(self.func, dimensions, dtype=np.float32)
+        xs = [d.x for d in optimizer.dimensions]
+        for x in xs:
+            self.assertEqual(x.dtype, np.float32)
+            self.assertFalse(x.flags.writeable)
+        self.assertTrue(xs[0] is xs[1] is xs[3])
+        self.assertTrue(xs[2] is xs[4])
+        self.assertFalse(xs[0] is xs[2])
+        self.assertTrue(np.allclose(xs[2], other))
+        self.assertEqual(len(optimizer.train(100, 3)), 3)
+
+
+class TestCheckpoints(unittest.TestCase):
+
+    @staticmethod
+    def func(solution):
+        return sum(float(v) ** 2 for v in solution)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'optimizer.ckpt')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def createOptimizer(self, **kwparam):
+        grid = asop.variableTypes.sharedGrid(np.linspace(-2, 2, 100))
+        dimensions = [asop.variableTypes.ContinuousVariable(grid,
+                                                            samplingStd=.1)
+                      for i in range(3)] #@UnusedVariable
+        if not kwparam.get('bank'):
+            dimensions.append(asop.variableTypes.IntegerVariable(range(-5, 6)))
+        return ASOP(self.func, dimensions, scaling='auto', archiveSize=5,
+                    **kwparam)
+
+    def assertSameState(self, optimizer, loaded):
+        self.assertEqual(optimizer.iteration, loaded.iteration)
+        self.assertEqual(optimizer.scaling, loaded.scaling)
+        for (d1, d2) in zip(optimizer.dimensions, loaded.dimensions):
+            self.assertTrue(np.array_equal(d1.x, d2.x))
+            self.assertTrue(np.array_equal(d1.pdfValues, d2.pdfValues))
+            self.assertTrue(np.array_equal(d1.scores, d2.scores))
+            self.assertEqual(d1.samplingStd, d2.samplingStd)
+
+    def testResumeIsExact(self):
+        for kwparam in ({}, {'learning': 'batch'}, {'dtype': np.float32},
+                        {'bank': True}):
+            for mmap in (False, True):
+                optimizer = self.createOptimizer(**kwparam)
+                optimizer.train(100)
+                optimizer.save(self.filename)
+                loaded = ASOP.load(self.filename, self.func, mmap=mmap)
+                self.assertSameState(optimizer, loaded)
+                expected = optimizer.train(100, 100)
+                loaded = ASOP.load(self.filename, self.func, mmap=mmap)
+                resumed = loaded.train(100, 100)
+                self.assertTrue(np.array_equal(expected.solutions,
+                                               resumed.solutions))
+                self.assertTrue(np.array_equal(expected.values,
+                                               resumed.values))
+                self.assertSameState(optimizer, loaded)
+
+    def testSharedGridStaysShared(self):
+        optimizer = self.createOptimizer()
+        optimizer.save(self.filename)
+        loaded = ASOP.load(self.filename)
+        self.assertTrue(loaded.dimensions[0].x is loaded.dimensions[1].x)
+        self.assertFalse(loaded.dimensions[0].x.flags.writeable)
+
+    def testDimensionsArePacked(self):
+        grid = asop.variableTypes.sharedGrid(np.linspace(-2, 2, 100))
+        Continuous = asop.variableTypes.ContinuousVariable
+        dimensions = [Continuous(grid, samplingStd=.1, name='a'),
+                      asop.variableTypes.IntegerVariable(range(-5, 6)),
+                      Continuous(grid, samplingStd=.2, name='b'),
+                      Continuous(np.linspace(0, 1, 7), name='c')]
+        optimizer = ASOP(self.func, dimensions, scaling='auto')
+        optimizer.train(50)
+        packed = optimizer.__getstate__()['dimensions']
+        self.assertEqual(len(packed.groups), 3)
+        for (cls_, indices, stacked, constants, columns) in packed.groups:
+            if indices == [0, 2]:
+                self.assertEqual(stacked['_scores'].shape, (2, 100))
+                self.assertTrue(constants['_x'] is grid)
+                self.assertEqual(columns['samplingStd'], [.1, .2])
+        optimizer.save(self.filename)
+        for mmap in (False, True):
+            loaded = ASOP.load(self.filename, self.func, mmap=mmap)
+            self.assertEqual([d.name for d in loaded.dimensions],
+                             [d.name for d in dimensions])
+            self.assertEqual([type(d) for d in loaded.dimensions],
+                             [type(d) for d in dimensions])
+            #rows of the same stacked block
+            self.assertTrue(loaded.dimensions[0]._scores.base is
+                            loaded.dimensions[2]._scores.base)
+            self.assertTrue(loaded.dimensions[0]._rng is None)
+            self.assertSameState(optimizer, loaded)
+            self.assertTrue('_rng' not in loaded.dimensions[0].__getstate__())
+            np.random.seed(1)
+            expected = optimizer.sample(20)
+            np.random.seed(1)
+            self.assertEqual(loaded.sample(20), expected)
+
+    def testPendingSolutionsAreSaved(self):
+        optimizer = ASOP(None, 2, tellBatchSize=10)
+        (ids, solutions) = optimizer.ask(6)
+        optimizer.tell(ids[:2], [1.0, 2.0])
+        optimizer.save(self.filename)
+        loaded = ASOP.load(self.filename)
+        self.assertEqual(loaded.nPending, 4)
+        self.assertEqual(loaded._toldSolutions, solutions[:2])
+        self.assertTrue(loaded.tell(ids[2:], [3.0, 4.0, 5.0, 6.0]) is False)
+        self.assertRaises(AssertionError, loaded.train)
+
+    def testAutosave(self):
+        optimizer = self.createOptimizer(checkpointFile=self.filename,
+                                         checkpointEvery=2)
+        optimizer.train(50)
+        self.assertFalse(os.path.exists(self.filename))
+        optimizer.train(50)
+        loaded = ASOP.load(self.filename, self.func)
+        self.assertSameState(optimizer, loaded)
+        self.assertEqual(loaded.checkpointFile, self.filename)
+        loaded.train(50)
+        loaded.train(50)
+        self.assertEqual(ASOP.load(self.filename).iteration, 4)
+
+    def testNotACheckpoint(self):
+        with open(self.filename, 'wb') as f:
+            f.write('x' * 100)
+        self.assertRaises(ValueError, ASOP.load, self.filename)
+
+
+class TestEvaluationCache(unittest.TestCase):
+
+    def createOptimizer(self, func, **kwparam):
+        dimensions = [asop.variableTypes.IntegerVariable(range(3)),
+                      asop.variableTypes.IntegerVariable(range(4))]
+        return ASOP(func, dimensions, scaling='auto', cacheSize=100,
+                    **kwparam)
+
+    def testEveryDistinctSolutionIsEvaluatedOnce(self):
+        calls = []
+        def func(solution):
+            calls.append(tuple(solution))
+            return float(solution[0] * 10 + solution[1])
+        optimizer = self.createOptimizer(func)
+        for i in range(5): #@UnusedVariable
+            population = optimizer.train(200, 200)
+            for (solution, value) in population:
+                self.assertEqual(value, solution[0] * 10 + solution[1])
+        self.assertEqual(len(calls), len(set(calls)))
+        self.assertTrue(len(calls) <= 12)
+        self.assertEqual(optimizer.cache.misses + optimizer.cache.hits, 1000)
+        self.assertEqual(optimizer.cache.misses, len(calls))
+
+    def testVectorized(self):
+        calls = []
+        def func(X):
+            calls.append(len(X))
+            return X[:, 0] * 10 + X[:, 1]
+        optimizer = self.createOptimizer(func, vectorized=True)
+        for i in range(3): #@UnusedVariable
+            population = optimizer.train(500, 500)
+            for (solution, value) in population:
+                self.assertEqual(value, solution[0] * 10 + solution[1])
+        self.assertTrue(sum(calls) <= 12)
+
+    def testNoneIsCached(self):
+        calls = []
+        def func(solution):
+            calls.append(tuple(solution))
+            return None
+        optimizer = ASOP(func, [asop.variableTypes.IntegerVariable(range(3))],
+                         cacheSize=10)
+        for i in range(3): #@UnusedVariable
+            values = optimizer._evaluateWithCache([(1, ), (1, )])
+            self.assertTrue(np.all(np.isnan(values)))
+        self.assertEqual(calls, [(1, )])
+        self.assertEqual((optimizer.cache.hits, optimizer.cache.misses),
+                         (5, 1))
+
+    def testSmallCapacity(self):
+        optimizer = self.createOptimizer(lambda s: float(sum(s)))
+        optimizer.cache = asop.EvaluationCache(2)
+        population = optimizer.train(100, 100)
+        for (solution, value) in population:
+            self.assertEqual(value, sum(solution))
+        self.assertEqual(len(optimizer.cache), 2)
+
+
+class TestDeduplication(unittest.TestCase):
+
+    @staticmethod
+    def func(solution):
+        return float(solution[0] - 1) ** 2 + float(solution[1]) ** 2
+
+    def createOptimizer(self, mixed=False, **kwparam):
+        '''Two discrete dimensions of 7 and 5 values, such that large
+        samples are mostly duplicates. With `mixed`, the second dimension
+        is continuous, and its draws are distinct'''
+        if mixed:
+            second = asop.variableTypes.ContinuousVariable(
+                np.linspace(-2, 2, 5), samplingStd=.5)
+        else:
+            second = asop.variableTypes.SparseIntegerVariable(
+                [-2, -1, 0, 1, 3])
+        dimensions = [asop.variableTypes.IntegerVariable(range(-3, 4)),
+                      second]
+        return ASOP(self.func, dimensions, scaling='auto', **kwparam)
+
+    def testWeightsEqualRepeatedSolutions(self):
+        for learning in asop.asop.LEARNING_MODES:
+            weighted = self.createOptimizer(learning=learning)
+            repeated = self.createOptimizer(learning=learning)
+            for i in range(5): #@UnusedVariable
+                s = repeated.sample(300, asArray=True)
+                (unique, weights) = ASOP._uniqueSolutions(s)
+                self.assertEqual(weights.sum(), 300)
+                self.assertTrue(len(unique) < 300)
+                repeated.learn(s, [self.func(r) for r in s])
+                weighted.learn(unique, [self.func(r) for r in unique],
+                               weights)
+            for (d1, d2) in zip(weighted.dimensions, repeated.dimensions):
+                self.assertTrue(np.allclose(d1.pdfValues, d2.pdfValues))
+
+    def testUniqueSolutions(self):
+        s = np.array([[1, 2], [3, 4], [1, 2], [1, 3], [3, 4], [1, 2]])
+        (unique, counts) = ASOP._uniqueSolutions(s)
+        self.assertEqual(unique.tolist(), [[1, 2], [3, 4], [1, 3]])
+        self.assertEqual(counts.tolist(), [3, 2, 1])
+        structured = np.array([(1, 0.5), (1, 0.5), (2, 0.5)],
+                              dtype=[('a', int), ('b', float)])
+        (unique, counts) = ASOP._uniqueSolutions(structured)
+        self.assertEqual(unique.tolist(), [(1, 0.5), (2, 0.5)])
+        self.assertEqual(counts.tolist(), [2, 1])
+
+    def testUniqueSolutionsNormalizesFloats(self):
+        otherNaN = np.array([0x7ff8000000000001], dtype=np.uint64).view(float)
+        s = np.array([[0.0, 1.0], [-0.0, 1.0], [np.nan, 2.0],
+                      [otherNaN[0], 2.0]])
+        structured = np.empty(4, dtype=[('a', float), ('b', float)])
+        structured['a'] = s[:, 0]
+        structured['b'] = s[:, 1]
+        for sample in (s, structured):
+            (unique, counts) = ASOP._uniqueSolutions(sample)
+            self.assertEqual(counts.tolist(), [2, 2])
+            self.assertEqual(len(unique), 2)
+        self.assertTrue(np.signbit(s[1, 0]))
+
+    def testTrainEvaluatesDistinctSolutions(self):
+        for vectorized in (False, True):
+            calls = []
+            if vectorized:
+                def func(X):
+                    calls.extend(map(tuple, X.tolist()))
+                    return (X[:, 0] - 1) ** 2 + X[:, 1] ** 2
+            else:
+                def func(solution):
+                    calls.append(tuple(solution))
+                    return self.func(solution)
+            optimizer = self.createOptimizer(deduplicate=True,
+                                             vectorized=vectorized)
+            optimizer.func = func
+            for i in range(3): #@UnusedVariable
+                del calls[:]
+                population = optimizer.train(500, 500)
+                self.assertEqual(len(calls), len(set(calls)))
+                self.assertEqual(len(population), len(calls))
+                self.assertTrue(len(calls) <= 35)
+            self.assertEqual(population.best(1).values[0], 0.0)
+
+    def testMixedDimensions(self):
+        optimizer = self.createOptimizer(mixed=True, deduplicate=True)
+        s = optimizer.sample(300, asArray=True)
+        (unique, weights) = ASOP._uniqueSolutions(s)
+        self.assertEqual(weights.sum(), 300)
+        self.assertEqual(len(unique), len(set(s.tolist())))
+        population = optimizer.train(300, 300)
+        self.assertEqual(population.weights.sum(), 300)
+        self.assertEqual(len(population),
+                         len(set(map(tuple, population.solutions.tolist()))))
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    @staticmethod
+    def func(solution):
+        return sum(float(v) ** 2 for v in solution)
+
+    def testDisabledByDefault(self):
+        optimizer = ASOP(self.func, 2)
+        self.assertTrue(optimizer.instrumentation is None)
+        optimizer.train(10)
+
+    def testPhasesAndCounters(self):
+        for learning in asop.asop.LEARNING_MODES:
+            records = []
+            instrumentation = asop.Instrumentation(records.append)
+            optimizer = ASOP(self.func, 3, scaling='auto', learning=learning,
+                             archiveSize=5, instrumentation=instrumentation)
+            for i in range(4): #@UnusedVariable
+                optimizer.train(50)
+            self.assertEqual(len(records), 4)
+            self.assertEqual([r['iteration'] for r in records], range(4))
+            self.assertTrue(instrumentation.history == records)
+            for r in records:
+                self.assertEqual(r['counters'],
+                                 {'evaluations': 50, 'learned': 50})
+                self.assertTrue(all(t >= 0 for t in r['times'].values()))
+                self.assertAlmostEqual(r['total'], sum(r['times'].values()))
+                for phase in ('sample', 'evaluate', 'update', 'apply',
+                              'archive'):
+                    self.assertTrue(r['times'][phase] > 0)
+                self.assertEqual(r['times']['checkpoint'], 0.0)
+            self.assertEqual(instrumentation.counters['evaluations'], 200)
+            self.assertEqual(instrumentation.counters['learned'], 200)
+            for phase in asop.instrumentation.PHASES:
+                self.assertAlmostEqual(
+                    instrumentation.totals[phase],
+                    sum(r['times'][phase] for r in records))
+            self.assertTrue(isinstance(instrumentation.summary(), str))
+            instrumentation.reset()
+            self.assertEqual(instrumentation.counters['evaluations'], 0)
+            self.assertEqual(instrumentation.history, [])
+
+    def testCacheAndDeduplication(self):
+        dimensions = [asop.variableTypes.IntegerVariable(range(3))
+                      for i in range(2)] #@UnusedVariable
+        optimizer = ASOP(self.func, dimensions, scaling='auto',
+                         cacheSize=100, deduplicate=True,
+                         instrumentation=True)
+        optimizer.train(100)
+        optimizer.train(100)
+        (first, second) = optimizer.instrumentation.history
+        self.assertTrue(first['counters']['evaluations'] <= 9)
+        self.assertEqual(first['counters']['evaluations'],
+                         first['counters']['learned'])
+        self.assertEqual(second['counters']['evaluations'] +
+                         first['counters']['evaluations'],
+                         len(optimizer.cache))
+
+    def testCheckpointBelongsToItsIteration(self):
+        directory = tempfile.mkdtemp()
+        try:
+            optimizer = ASOP(self.func, 2, instrumentation=True,
+                             checkpointFile=os.path.join(directory, 'ckpt'),
+                             checkpointEvery=2)
+            for i in range(4): #@UnusedVariable
+                optimizer.train(10)
+        finally:
+            shutil.rmtree(directory)
+        times = [r['times']['checkpoint']
+                 for r in optimizer.instrumentation.history]
+        self.assertEqual(len(times), 4)
+        self.assertEqual(times[0], 0.0)
+        self.assertTrue(times[1] > 0)
+        self.assertEqual(times[2], 0.0)
+        self.assertTrue(times[3] > 0)
+
+    def testAskTell(self):
+        optimizer = ASOP(None, 2, instrumentation=True)
+        (ids, solutions) = optimizer.ask(20)
+        optimizer.tell(ids, [self.func(s) for s in solutions])
+        (record, ) = optimizer.instrumentation.history
+        self.assertEqual(record['counters'],
+                         {'evaluations': 0, 'learned': 20})
+        self.assertTrue(record['times']['sample'] > 0)
+
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
\ No newline at end of file
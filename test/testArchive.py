@@ -0,0 +1,80 @@
+import unittest
+import numpy as np
+
+import asop
+from asop.archive import EliteArchive
+
+
+class TestEliteArchive(unittest.TestCase):
+
+    def testKeepsBestAcrossBatches(self):
+        for direction in (asop.MINIMIZE, asop.MAXIMIZE):
+            archive = EliteArchive(10, direction)
+            allSolutions = []
+            allValues = []
+            for batch in range(20): #@UnusedVariable
+                n = np.random.randint(1, 50)
+                solutions = np.random.randn(n, 2)
+                values = np.random.randn(n)
+                archive.update(solutions, values)
+                allSolutions.extend(solutions)
+                allValues.extend(values)
+                self.assertTrue(len(archive) <= 10)
+
+                expected = np.sort(allValues)
+                if direction == asop.MAXIMIZE:
+                    expected = expected[::-1]
+                best = archive.best()
+                self.assertTrue(np.all(best.values ==
+                                       expected[:len(archive)]))
+                for (s, v) in best:
+                    self.assertTrue(np.all(
+                        allSolutions[allValues.index(v)] == s))
+            self.assertEqual(archive.worstValue, expected[9])
+            self.assertEqual(len(archive.best(3)), 3)
+
+    def testIgnoresNaN(self):
+        archive = EliteArchive(5)
+        archive.update([(0, ), (1, ), (2, )], [np.nan, 1.0, np.nan])
+        self.assertEqual(len(archive), 1)
+
+    def testEmpty(self):
+        archive = EliteArchive(5)
+        self.assertEqual(len(archive.best()), 0)
+        self.assertEqual(archive.worstValue, None)
+
+    def testOptimizerArchive(self):
+        func = lambda s: sum(v ** 2 for v in s)
+        optimizer = asop.ASOP(func, 2, scaling='auto', archiveSize=5)
+        lBest = []
+        for i in range(10): #@UnusedVariable
+            lBest.extend(optimizer.train(100, 5).values)
+        self.assertEqual(len(optimizer.archive), 5)
+        self.assertTrue(np.allclose(optimizer.archive.best().values,
+                                    np.sort(lBest)[:5]))
+        self.assertEqual(asop.ASOP(func, 2).archive, None)
+
+    def testMixedDimensionsTrainAndTell(self):
+        func = lambda s: float(s[0]) ** 2 + float(s[1]) ** 2
+        for trainFirst in (True, False):
+            dimensions = [asop.variableTypes.IntegerVariable(range(-5, 6)),
+                          asop.variableTypes.ContinuousVariable()]
+            optimizer = asop.ASOP(func, dimensions, scaling='auto',
+                                  archiveSize=5)
+            for i in range(2): #@UnusedVariable
+                if trainFirst:
+                    optimizer.train(50)
+                (ids, solutions) = optimizer.ask(50)
+                optimizer.tell(ids, map(func, solutions))
+                if not trainFirst:
+                    optimizer.train(50)
+            optimizer.trainConcurrently(20)
+            best = optimizer.archive.best()
+            self.assertEqual(len(best), 5)
+            self.assertEqual(best.solutions.dtype.names, ('X0', 'X1'))
+            for (solution, value) in best:
+                self.assertEqual(value, func(solution))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+import asop
+from asop.bank import DimensionBank, BankedVariable
+from asop.variableTypes import ContinuousVariable
+
+
+def createVariables(n=3, grid=None):
+    if grid is None:
+        grid = np.linspace(-2, 2, 200)
+    return [ContinuousVariable(grid, samplingStd=.1) for i in range(n)] #@UnusedVariable
+
+
+class TestDimensionBank(unittest.TestCase):
+
+    def assertSameDistributions(self, variables, bank):
+        for (v, row) in zip(variables, bank.dimensions):
+            self.assertTrue(np.allclose(v.pdfValues, row.pdfValues,
+                                        rtol=1e-6, atol=1e-12))
+
+    def testUpdatesEqualIndependentVariables(self):
+        for grid in (np.linspace(-2, 2, 200),
+                     np.sort(np.random.uniform(-2, 2, 200))):
+            for method in ('kernel', 'histogram'):
+                variables = createVariables(3, grid)
+                bank = DimensionBank.fromVariables(createVariables(3, grid))
+                for i in range(5): #@UnusedVariable
+                    amounts = np.random.randn(100)
+                    locations = np.random.uniform(-2, 2, (3, 100))
+                    for (v, loc) in zip(variables, locations):
+                        v.alterSamplingDistributionBatch(amounts, loc, .1,
+                                                         method=method)
+                    bank.alterSamplingDistributionBatch(amounts, locations,
+                                                        .1, method=method)
+                self.assertSameDistributions(variables, bank)
+
+    def testRowOperations(self):
+        variables = createVariables(3)
+        bank = DimensionBank.fromVariables(createVariables(3))
+        variables[1].alterSamplingDistribution(2.0, 0.5, .1)
+        bank.dimensions[1].alterSamplingDistribution(2.0, 0.5, .1)
+        variables[2].alterSamplingDistributionBatch([1.0, -1.0], [0, 1], .2)
+        bank.dimensions[2].alterSamplingDistributionBatch([1.0, -1.0], [0, 1],
+                                                          .2)
+        self.assertSameDistributions(variables, bank)
+        self.assertTrue(np.all(bank.dimensions[0].pdfValues ==
+                               bank.dimensions[0].pdfValues[0]))
+
+    def testSamplesFollowThePdf(self):
+        x = np.linspace(-2, 2, 401)
+        bank = DimensionBank(x, 3)
+        centers = [-1.0, 0.0, 1.0]
+        for (i, center) in enumerate(centers):
+            bank._pdf[i] = np.exp(-(x - center) ** 2 / (2 * 0.25 ** 2))
+        bank._buildCdf(slice(0, 3))
+        s = bank.random(100000)
+        self.assertEqual(s.shape, (100000, 3))
+        self.assertTrue(np.all((s >= -2) & (s <= 2)))
+        for (column, center) in zip(s.T, centers):
+            self.assertAlmostEqual(np.mean(column), center, 2)
+            self.assertAlmostEqual(np.std(column), 0.25, 2)
+        single = bank.dimensions[2].random(1000)
+        self.assertEqual(single.shape, (1000,))
+        self.assertTrue(np.isscalar(bank.dimensions[0].random()))
+
+    def testRejectsHeterogeneousVariables(self):
+        variables = createVariables(2) + \
+            [ContinuousVariable(np.linspace(-1, 1, 200), samplingStd=.1)]
+        self.assertRaises(ValueError, DimensionBank.fromVariables, variables)
+        variables = createVariables(2) + \
+            [asop.variableTypes.IntegerVariable(range(200))]
+        self.assertRaises(ValueError, DimensionBank.fromVariables, variables)
+        variables = createVariables(2) + \
+            [ContinuousVariable(np.linspace(-2, 2, 200), samplingStd=.1,
+                                kernelTruncation=4)]
+        self.assertRaises(ValueError, DimensionBank.fromVariables, variables)
+
+    def testKernelSumChunks(self):
+        amounts = np.random.randn(50)
+        locations = np.random.uniform(-2, 2, (5, 50))
+        reference = DimensionBank(np.linspace(-2, 2, 200), 5, .1)
+        reference.alterSamplingDistributionBatch(amounts, locations)
+        for chunkSize in (1, 300, 1000):
+            bank = DimensionBank(np.linspace(-2, 2, 200), 5, .1)
+            bank.BATCH_CHUNK_SIZE = chunkSize
+            bank.alterSamplingDistributionBatch(amounts, locations)
+            self.assertTrue(np.allclose(bank._scores, reference._scores))
+
+    def testMemmap(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'bank.dat')
+            for dtype in (np.float64, np.float32):
+                bank = DimensionBank(np.linspace(-2, 2, 100), 4, .1,
+                                     dtype=dtype, filename=filename)
+                self.assertTrue(isinstance(bank._pdf, np.memmap))
+                self.assertEqual(bank._pdf.dtype, dtype)
+                bank.alterSamplingDistributionBatch(
+                    np.ones(10), np.random.uniform(-2, 2, (4, 10)))
+                self.assertEqual(bank.random(10).shape, (10, 4))
+                bank.flush()
+                del bank
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestBankedOptimizer(unittest.TestCase):
+
+    @staticmethod
+    def func(solution):
+        return sum(float(v) ** 2 for v in solution)
+
+    def testLearnsLikeIndependentDimensions(self):
+        for learning in asop.asop.LEARNING_MODES:
+            banked = asop.ASOP(self.func, createVariables(4), scaling='auto',
+                               learning=learning, bank=True)
+            reference = asop.ASOP(self.func, createVariables(4),
+                                  scaling='auto', learning=learning)
+            self.assertTrue(isinstance(banked.dimensions[0], BankedVariable))
+            for i in range(5): #@UnusedVariable
+                s = reference.sample(100, asArray=True)
+                values = [self.func(r) for r in s]
+                banked.learn(s, values)
+                reference.learn(s, values)
+            for (d, dRef) in zip(banked.dimensions, reference.dimensions):
+                self.assertTrue(np.allclose(d.pdfValues, dRef.pdfValues,
+                                            rtol=1e-6, atol=1e-12))
+            self.assertEqual(banked.sample(10, asArray=True).shape, (10, 4))
+            self.assertEqual(len(banked.sample(10)), 10)
+            self.assertEqual(len(banked.train(100, 3)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
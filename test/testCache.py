@@ -0,0 +1,49 @@
+import cPickle
+import unittest
+
+from asop.cache import EvaluationCache
+
+
+class TestEvaluationCache(unittest.TestCase):
+
+    def testLeastRecentlyUsedIsEvicted(self):
+        cache = EvaluationCache(3)
+        for i in range(3):
+            cache.put((i, ), float(i))
+        self.assertEqual(cache.get((0, )), 0.0)
+        cache.put((3, ), 3.0)
+        self.assertEqual(len(cache), 3)
+        self.assertFalse((1, ) in cache)
+        for i in (0, 2, 3):
+            self.assertTrue((i, ) in cache)
+        cache.put((2, ), 20.0)
+        cache.put((4, ), 4.0)
+        self.assertFalse((0, ) in cache)
+        self.assertEqual(cache.get((2, )), 20.0)
+
+    def testCounters(self):
+        cache = EvaluationCache(10)
+        self.assertTrue(cache.hitRate is None)
+        self.assertTrue(cache.get((1, 2)) is None)
+        self.assertEqual(cache.get((1, 2), -1), -1)
+        cache.put((1, 2), 5.0)
+        self.assertEqual(cache.get((1, 2)), 5.0)
+        self.assertTrue((1, 2) in cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        self.assertAlmostEqual(cache.hitRate, 1 / 3.0)
+        cache.clear()
+        self.assertEqual((len(cache), cache.hits, cache.misses), (0, 0, 0))
+
+    def testPickle(self):
+        cache = EvaluationCache(2)
+        for i in range(3):
+            cache.put((i, ), float(i))
+        cache.get((1, ))
+        loaded = cPickle.loads(cPickle.dumps(cache, cPickle.HIGHEST_PROTOCOL))
+        loaded.put((3, ), 3.0)
+        self.assertFalse((2, ) in loaded)
+        self.assertEqual((loaded.hits, loaded.misses), (1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
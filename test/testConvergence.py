@@ -0,0 +1,156 @@
+import unittest
+import numpy as np
+
+import asop
+from asop.population import Population
+from asop import convergence
+from asop.variableTypes import ContinuousVariable, IntegerVariable
+
+
+class TestStatistics(unittest.TestCase):
+
+    def testNormalizedEntropy(self):
+        self.assertAlmostEqual(convergence.normalizedEntropy(np.ones(100)),
+                               1.0)
+        p = np.zeros(100)
+        p[3] = 2.0
+        self.assertEqual(convergence.normalizedEntropy(p), 0.0)
+        p[4] = 2.0
+        self.assertAlmostEqual(convergence.normalizedEntropy(p),
+                               np.log(2) / np.log(100))
+        self.assertEqual(convergence.normalizedEntropy([1.0]), 0.0)
+
+    def testCentralWidth(self):
+        x = np.linspace(0, 1, 101)
+        self.assertAlmostEqual(convergence.centralWidth(x, np.ones(101), 0.9),
+                               0.9, 1)
+        p = np.zeros(101)
+        p[50] = 1.0
+        self.assertEqual(convergence.centralWidth(x, p, 0.95), 0.0)
+
+
+class TestCriteria(unittest.TestCase):
+
+    def population(self, values, direction=asop.MINIMIZE, weights=None):
+        values = np.asarray(values, dtype=float)
+        return Population(np.zeros((len(values), 1)), values,
+                          direction=direction, weights=weights)
+
+    def testStagnation(self):
+        criterion = convergence.StagnationCriterion(3, tolerance=0.5)
+        results = [criterion.update(None, self.population(v))
+                   for v in ([5, 4], [3], [2.8], [2.6, np.nan], [2.7],
+                             [1.0])]
+        self.assertEqual(results, [False, False, False, False, True, False])
+        criterion.reset()
+        self.assertFalse(criterion.update(None, self.population([10])))
+        criterion = convergence.StagnationCriterion(1)
+        criterion.update(None, self.population([1], asop.MAXIMIZE))
+        self.assertFalse(criterion.update(None,
+                                          self.population([2], asop.MAXIMIZE)))
+        self.assertTrue(criterion.update(None,
+                                         self.population([0], asop.MAXIMIZE)))
+
+    def testSpread(self):
+        criterion = convergence.SpreadCriterion(0.1)
+        self.assertFalse(criterion.update(None, self.population([0, 1])))
+        self.assertTrue(criterion.update(None,
+                                         self.population([1, 1.01, np.nan])))
+        self.assertAlmostEqual(criterion.last, 0.005)
+        self.assertFalse(criterion.update(None, self.population([1])))
+
+    def testWeightedSpread(self):
+        criterion = convergence.SpreadCriterion(0.1)
+        self.assertTrue(criterion.update(None, self.population([1],
+                                                               weights=[3])))
+        self.assertEqual(criterion.last, 0.0)
+        self.assertFalse(criterion.update(None, self.population([1],
+                                                                weights=[1])))
+        self.assertTrue(criterion.update(
+            None, self.population([0, 1, np.nan], weights=[99, 1, 5])))
+        self.assertAlmostEqual(criterion.last, np.std([0] * 99 + [1]))
+
+    def testDistributionCriteria(self):
+        optimizer = asop.ASOP(None, [ContinuousVariable(np.linspace(-1, 1, 201)),
+                                     IntegerVariable(range(10))])
+        entropy = convergence.EntropyCriterion(0.05)
+        width = convergence.SupportWidthCriterion([0.5, 2])
+        self.assertFalse(entropy.update(optimizer, None))
+        self.assertFalse(width.update(optimizer, None))
+        self.assertTrue(np.allclose(entropy.last, 1.0))
+        for d in optimizer.dimensions:
+            d._pdfValues[:] = 0
+            d._pdfValues[len(d.x) // 2] = 1.0
+        self.assertTrue(entropy.update(optimizer, None))
+        self.assertTrue(width.update(optimizer, None))
+        self.assertEqual(width.last.tolist(), [0.0, 0.0])
+
+    def testBaseIsAbstract(self):
+        self.assertRaises(TypeError, convergence.ConvergenceCriterion)
+
+    def testAllOf(self):
+        criterion = convergence.AllOf(convergence.SpreadCriterion(0.1),
+                                      convergence.StagnationCriterion(1))
+        self.assertFalse(criterion.update(None, self.population([1, 1])))
+        self.assertTrue(criterion.update(None, self.population([1, 1])))
+        self.assertFalse(criterion.update(None, self.population([1, 2])))
+        criterion.reset()
+        self.assertTrue(criterion.criteria[1].last is None)
+
+
+class TestOptimize(unittest.TestCase):
+
+    @staticmethod
+    def func(solution):
+        return sum(float(v) ** 2 for v in solution)
+
+    def testStopsWhenConverged(self):
+        dimensions = [IntegerVariable(range(-5, 6)) for i in range(2)] #@UnusedVariable
+        optimizer = asop.ASOP(self.func, dimensions, scaling='auto')
+        stagnation = convergence.StagnationCriterion(5)
+        (population, criterion) = optimizer.optimize(
+            100, 1000, [convergence.EntropyCriterion(0.0), stagnation], 3)
+        self.assertTrue(criterion is stagnation)
+        self.assertTrue(optimizer.iteration < 1000)
+        self.assertEqual(len(population), 3)
+        self.assertEqual(population.values[0], 0.0)
+        self.assertEqual(tuple(population.solutions[0]), (0, 0))
+
+    def testMaxIterations(self):
+        optimizer = asop.ASOP(self.func, 2, scaling='auto')
+        (population, criterion) = optimizer.optimize(
+            20, 3, [convergence.SpreadCriterion(0.0)])
+        self.assertTrue(criterion is None)
+        self.assertEqual(optimizer.iteration, 3)
+        self.assertEqual(len(population), 1)
+
+    def testDeduplicate(self):
+        class Recorder(convergence.ConvergenceCriterion):
+            def update(self, optimizer, population):
+                self.last = population
+                return False
+
+        dimensions = [IntegerVariable(range(-5, 6)) for i in range(2)] #@UnusedVariable
+        optimizer = asop.ASOP(self.func, dimensions, scaling='auto',
+                              deduplicate=True)
+        recorder = Recorder()
+        spread = convergence.SpreadCriterion(0.0)
+        optimizer.optimize(50, 3, [recorder, spread])
+        last = recorder.last
+        self.assertEqual(last.weights.sum(), 50)
+        self.assertEqual(len(last), len(set(map(tuple, last.solutions))))
+        values = np.repeat(last.values, last.weights.astype(int))
+        self.assertAlmostEqual(spread.last, values.std())
+
+    def testUsesTheArchive(self):
+        optimizer = asop.ASOP(self.func, 2, scaling='auto', archiveSize=5)
+        (population, criterion) = optimizer.optimize(
+            20, 3, [convergence.SpreadCriterion(0.0)], 3)
+        self.assertTrue(criterion is None)
+        self.assertEqual(len(optimizer.archive), 5)
+        self.assertEqual(population.values.tolist(),
+                         optimizer.archive.best(3).values.tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
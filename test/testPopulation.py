@@ -0,0 +1,82 @@
+import unittest
+import numpy as np
+
+import asop
+from asop.population import Population
+
+
+class TestPopulation(unittest.TestCase):
+
+    def createPopulation(self, n=1000, direction=asop.MINIMIZE):
+        solutions = np.random.randn(n, 3)
+        values = np.random.randn(n)
+        return Population(solutions, values, values * 2, 7, direction)
+
+    def testBestEqualsSorting(self):
+        for direction in (asop.MINIMIZE, asop.MAXIMIZE):
+            pop = self.createPopulation(direction=direction)
+            expected = np.argsort(pop.values)
+            if direction == asop.MAXIMIZE:
+                expected = expected[::-1]
+            for k in (0, 1, 10, 999, 1000, 2000):
+                best = pop.best(k)
+                self.assertEqual(len(best), min(k, len(pop)))
+                self.assertTrue(np.all(best.values ==
+                                       pop.values[expected[:k]]))
+                self.assertTrue(np.all(best.solutions ==
+                                       pop.solutions[expected[:k]]))
+                self.assertTrue(np.all(best.scaled == best.values * 2))
+                self.assertEqual(best.iteration, 7)
+
+    def testIterationYieldsPairs(self):
+        pop = self.createPopulation(10)
+        pairs = list(pop)
+        self.assertEqual(len(pairs), 10)
+        for (i, (s, v)) in enumerate(pairs):
+            self.assertTrue(isinstance(s, tuple))
+            self.assertEqual(s, tuple(pop.solutions[i]))
+            self.assertEqual(v, pop.values[i])
+        self.assertEqual(pop[-1], pairs[-1])
+        self.assertRaises(IndexError, pop.__getitem__, 10)
+
+    def testSlicesAndIndexArrays(self):
+        pop = self.createPopulation(10)
+        pairs = list(pop)
+        for key in (slice(0, 2), slice(None, None, -3), slice(20, 30)):
+            sub = pop[key]
+            self.assertTrue(isinstance(sub, Population))
+            self.assertEqual(list(sub), pairs[key])
+            self.assertEqual(sub.iteration, 7)
+        self.assertEqual(list(pop[[4, 1, 4]]), [pairs[4], pairs[1], pairs[4]])
+        mask = pop.values > 0
+        self.assertEqual(list(pop[mask]),
+                         [p for (p, m) in zip(pairs, mask) if m])
+        best = asop.ASOP(lambda s: sum(s), 2).train(20, 5)
+        self.assertEqual(list(best[0:2]), list(best)[0:2])
+
+    def testStructuredSolutions(self):
+        solutions = np.zeros(5, dtype=[('a', float), ('b', int)])
+        solutions['b'] = np.arange(5)
+        pop = Population(solutions, np.arange(5.0))
+        self.assertEqual(pop.best(1)[0], ((0.0, 0), 0.0))
+
+    def testWeightsFollowTheSolutions(self):
+        pop = Population(np.arange(4.0)[:, np.newaxis], [3, 1, 2, 0],
+                         weights=[1, 2, 3, 4])
+        self.assertEqual(pop.best(2).weights.tolist(), [4, 2])
+        self.assertTrue(self.createPopulation(10).best(3).weights is None)
+
+    def testTrainReturnsPopulation(self):
+        func = lambda s: sum(v ** 2 for v in s)
+        optimizer = asop.ASOP(func, 2, scaling='auto')
+        for iteration in range(3):
+            ret = optimizer.train(100, 10)
+            self.assertTrue(isinstance(ret, Population))
+            self.assertEqual(len(ret), 10)
+            self.assertEqual(ret.iteration, iteration)
+            self.assertTrue(np.all(np.diff(ret.values) >= 0))
+        self.assertEqual(len(optimizer.train(100)), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+import numpy as np
+
+from asop import sampling
+
+
+class TestContinuousSampler(unittest.TestCase):
+
+    def testGuidedSearchEqualsBinarySearch(self):
+        x = np.linspace(-2, 2, 1000)
+        for pdf in (np.ones(1000), np.exp(-x ** 2 / 0.001),
+                    (x > 1.5).astype(float)):
+            sampler = sampling.ContinuousSampler(x, pdf)
+            u = np.random.random_sample(10000) * sampler._cdf[-1]
+            self.assertTrue(np.all(sampler._search(u) ==
+                                   np.searchsorted(sampler._cdf, u, 'right')))
+
+    def testSamplesFollowThePdf(self):
+        x = np.linspace(-2, 2, 401)
+        pdf = np.exp(-x ** 2 / 0.5)
+        sampler = sampling.ContinuousSampler(x, pdf)
+        s = sampler.random(200000)
+        self.assertTrue(np.all((s >= -2) & (s <= 2)))
+        self.assertAlmostEqual(np.mean(s), 0.0, 2)
+        self.assertAlmostEqual(np.std(s), 0.5, 2)
+
+    def testZeroDensityIntervalsAreNotSampled(self):
+        x = np.arange(10.0)
+        pdf = np.zeros(10)
+        pdf[[2, 7]] = 1.0
+        sampler = sampling.ContinuousSampler(x, pdf)
+        s = sampler.random(10000)
+        inside = ((s >= 1) & (s <= 3)) | ((s >= 6) & (s <= 8))
+        self.assertTrue(np.all(inside))
+
+    def testSetPdf(self):
+        x = np.linspace(0, 1, 11)
+        sampler = sampling.ContinuousSampler(x, np.ones(11))
+        pdf = np.zeros(11)
+        pdf[-2:] = 1.0
+        sampler.set_pdf(x, pdf)
+        self.assertTrue(np.all(sampler.random(1000) >= 0.8))
+
+    def testTinyDensities(self):
+        x = np.linspace(0, 1, 11)
+        sampler = sampling.ContinuousSampler(x, np.ones(11) * 1e-320)
+        self.assertEqual(len(sampler.random(10)), 10)
+
+    def testScalar(self):
+        sampler = sampling.ContinuousSampler([0.0, 1.0], [1.0, 1.0])
+        self.assertTrue(np.isscalar(sampler.random()))
+        sampler = sampling.ContinuousSampler([3.0], [1.0])
+        self.assertEqual(sampler.random(), 3.0)
+
+
+class TestDiscreteSampler(unittest.TestCase):
+
+    def testFrequencies(self):
+        x = np.array([1, 10, 100, 1000])
+        pdf = np.array([0.1, 0.2, 0.3, 0.4])
+        sampler = sampling.DiscreteSampler(x, pdf * 1e-300)
+        s = sampler.random(100000)
+        self.assertEqual(s.dtype.kind, 'i')
+        for (v, p) in zip(x, pdf):
+            self.assertAlmostEqual(np.mean(s == v), p, 2)
+
+    def testZeroProbabilityValuesAreNotSampled(self):
+        sampler = sampling.DiscreteSampler(range(5), [0, 1, 0, 0, 1])
+        self.assertEqual(set(sampler.random(1000)), set([1, 4]))
+
+
+class TestAliasSampler(unittest.TestCase):
+
+    def testTableMatchesThePdf(self):
+        #probability of every value implied by the table: its own column
+        #plus the columns it is the alias of
+        for n in (1, 2, 7, 100):
+            for pdf in (np.random.random_sample(n) ** 5,
+                        np.random.random_sample(n) * (np.arange(n) % 3 == 0),
+                        np.ones(n)):
+                sampler = sampling.AliasSampler(range(n), pdf)
+                p = np.bincount(np.arange(n), weights=sampler._prob,
+                                minlength=n)
+                p += np.bincount(sampler._alias, weights=1 - sampler._prob,
+                                 minlength=n)
+                p /= n
+                self.assertTrue(np.allclose(p, pdf / np.sum(pdf),
+                                            rtol=0, atol=1e-12))
+
+    def testOneLargeValueManySmallOnes(self):
+        pdf = np.ones(1000)
+        pdf[500] = 1e6
+        sampler = sampling.AliasSampler(range(1000), pdf)
+        s = sampler.random(100000)
+        self.assertAlmostEqual(np.mean(s == 500), 1e6 / (1e6 + 999), 2)
+
+    def testFrequencies(self):
+        x = np.array([1, 10, 100, 1000])
+        pdf = np.array([0.1, 0.2, 0.3, 0.4])
+        sampler = sampling.AliasSampler(x, pdf * 1e-300)
+        s = sampler.random(100000)
+        self.assertEqual(s.dtype.kind, 'i')
+        for (v, p) in zip(x, pdf):
+            self.assertAlmostEqual(np.mean(s == v), p, 2)
+
+    def testZeroProbabilityValuesAreNotSampled(self):
+        sampler = sampling.AliasSampler(range(5), [0, 1, 0, 0, 1])
+        self.assertEqual(set(sampler.random(1000)), set([1, 4]))
+        self.assertTrue(np.isscalar(sampler.random()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import cPickle
 import numpy as np
 import unittest
 from abc import ABCMeta, abstractmethod
@@ -49,6 +50,16 @@ class CaseBase(object):
     
     def testIsCallable(self):
         self.assertTrue(callable(self.obj))
+
+    def testPickle(self):
+        obj = cPickle.loads(cPickle.dumps(self.obj, cPickle.HIGHEST_PROTOCOL))
+        self.assertEqual(obj, self.obj)
+        x = np.linspace(-3, 3)
+        self.assertTrue(np.array_equal(obj(x), self.obj(x)))
+
+    def testBaseIsAbstract(self):
+        self.assertRaises(TypeError, scaling.ScalingBase)
+        self.assertTrue(isinstance(self.obj, scaling.ScalingBase))
         
     @abstractmethod
     def testValues(self):
@@ -16,7 +16,8 @@ class TestGeneral(unittest.TestCase):
                     variableTypes.QuantitativeVariableBase]
     
     lConcreteClasses = [variableTypes.ContinuousVariable,
-                        variableTypes.IntegerVariable]
+                        variableTypes.IntegerVariable,
+                        variableTypes.SparseIntegerVariable]
     
     
 
@@ -146,6 +147,94 @@ class TestGeneral(unittest.TestCase):
             
                   
 
+    def testBatchUpdateIsIdenticalToSequential(self):
+        '''Batch score update has to be identical to one-by-one updates'''
+
+        TIMES = 100
+        for cls_ in self.lConcreteClasses:
+            obj = cls_()
+            x = obj.x
+            theRange = np.max(x) - np.min(x)
+            lix = np.random.randint(0, len(x), TIMES)
+            locations = np.array(x)[lix]
+            amount = np.random.randn(TIMES) * 10.0
+            for width in (0.1 * theRange, 0):
+                if width == 0 and cls_ is variableTypes.ContinuousVariable:
+                    continue
+                obj = cls_()
+                for (a, loc) in zip(amount, locations):
+                    obj.alterSamplingDistribution(a, loc, width,
+                                                  immediateApply=False)
+                obj.applySamplingScore()
+                pdfSequential = np.array(obj.pdfValues)
+
+                obj = cls_()
+                obj.alterSamplingDistributionBatch(amount, locations, width)
+                pdfBatch = np.array(obj.pdfValues)
+
+                d = np.sum(np.square(pdfSequential - pdfBatch))
+                self.assertAlmostEquals(d, 0, self.NDIGITS)
+
+
+    def testHistogramUpdateOnSamplingValues(self):
+        '''Histogram update at sampling values is identical to kernel update'''
+
+        TIMES = 100
+        for cls_ in self.lConcreteClasses:
+            for kernelTruncation in (None, 5):
+                obj = cls_(kernelTruncation=kernelTruncation)
+                x = obj.x
+                width = 0.05 * (np.max(x) - np.min(x))
+                locations = np.array(x)[np.random.randint(0, len(x), TIMES)]
+                amount = np.random.randn(TIMES) * 10.0
+                obj.alterSamplingDistributionBatch(amount, locations, width,
+                                                   method='kernel')
+                pdfKernel = np.array(obj.pdfValues)
+
+                obj = cls_(kernelTruncation=kernelTruncation)
+                obj.alterSamplingDistributionBatch(amount, locations, width,
+                                                   method='histogram')
+                pdfHistogram = np.array(obj.pdfValues)
+
+                d = np.sum(np.square(pdfKernel - pdfHistogram))
+                self.assertAlmostEquals(d, 0, self.NDIGITS)
+
+    def testHistogramUpdateUnequallySpaced(self):
+        x = np.cumsum(np.random.uniform(0.01, 0.1, 300))
+        locations = np.random.choice(x, 100)
+        amount = np.random.randn(100)
+        kernel = variableTypes.ContinuousVariable(x)
+        kernel.alterSamplingDistributionBatch(amount, locations, 0.2)
+        histogram = variableTypes.ContinuousVariable(x)
+        histogram.alterSamplingDistributionBatch(amount, locations, 0.2,
+                                                 method='histogram')
+        d = np.sum(np.square(np.subtract(kernel.pdfValues,
+                                         histogram.pdfValues)))
+        self.assertAlmostEquals(d, 0, self.NDIGITS)
+
+
+    def testSinglePrecision(self):
+        TIMES = 300
+        objects = [cls_(dtype=np.float32) for cls_ in self.lConcreteClasses]
+        #explicit sampling values, including a sparse one
+        objects.append(variableTypes.ContinuousVariable(
+            np.linspace(-3, 5, 77), dtype=np.float32))
+        objects.append(variableTypes.SparseIntegerVariable(
+            [-4, 0, 3, 10, 11], dtype=np.float32))
+        self.assertEqual(len(objects), len(self.lConcreteClasses) + 2)
+        for obj in objects:
+            x = np.asarray(obj.x)
+            for (a, loc) in zip(np.random.randn(TIMES) * 10.0,
+                                x[np.random.randint(0, len(x), TIMES)]):
+                obj.alterSamplingDistribution(a, loc, 0.1 * np.ptp(x))
+            for a in (obj.scores, obj.pdfValues, obj._rng._cdf):
+                self.assertEqual(a.dtype, np.float32)
+            self.assertTrue(np.all(np.isfinite(obj.pdfValues)))
+            self.assertAlmostEqual(np.sum(obj.pdfValues), 1.0, 4)
+            obj.setDtype(np.float64)
+            self.assertEqual(obj.pdfValues.dtype, np.float64)
+            self.assertEqual(len(obj.rand(10)), 10)
+
     def testFailOnUnequalParameters(self):
         values = [1,2,3]
         scores = [1,2,3,4]
@@ -177,6 +266,32 @@ class TestGeneral(unittest.TestCase):
         for pOrig, pFromLogit in zip(pValues, pValuesFromLogit):
             self.assertAlmostEqual(pOrig, pFromLogit, self.NDIGITS)
 
+    def testInverseLogitExtremeValues(self):
+        logit = np.array([-1000.0, -700.0, -40.0, 0.0, 40.0, 1000.0])
+        p = variableTypes.inverseLogit(logit)
+        self.assertTrue(np.all(np.isfinite(p)))
+        self.assertEqual(p[0], 0.0)
+        self.assertAlmostEqual(p[1] / np.exp(-700.0), 1.0, 12)
+        self.assertAlmostEqual(p[2] / np.exp(-40.0), 1.0, 12)
+        self.assertAlmostEqual(p[3], 0.5, 15)
+        self.assertEqual(p[-1], 1.0)
+        #in place evaluation
+        out = np.empty(len(logit))
+        ret = variableTypes.inverseLogit(logit.copy(), out=out,
+                                         overwriteInput=True)
+        self.assertTrue(ret is out)
+        self.assertTrue(np.all(out == p))
+
+    def testApplySamplingScoreReusesWorkArrays(self):
+        for cls_ in self.lConcreteClasses:
+            obj = cls_()
+            arrays = (obj._workScores, obj._workProbability, obj._pdfValues)
+            obj.alterSamplingDistribution(1.0, obj.x[3], 0.1)
+            self.assertTrue(all(a is b for (a, b) in
+                                zip(arrays, (obj._workScores,
+                                             obj._workProbability,
+                                             obj._pdfValues))))
+
     def testRandFunctionWorks(self):
         TIMES = 100
 
@@ -200,6 +315,49 @@ class TestContinuousVariable(unittest.TestCase):
         v = variableTypes.ContinuousVariable(range(10))
         del v
 
+    def testSharedGrid(self):
+        grid = variableTypes.sharedGrid(np.linspace(-2, 2, 1000))
+        variables = [variableTypes.ContinuousVariable(grid) for i in range(3)] #@UnusedVariable
+        for v in variables:
+            self.assertTrue(v.x is grid)
+            self.assertFalse(hasattr(v, '__dict__'))
+        v = variables[0]
+        self.assertRaises(ValueError, v.x.__setitem__, 0, 5.0)
+        self.assertRaises(ValueError, v.pdfValues.__setitem__, 0, 5.0)
+        #writeable values are copied
+        values = np.linspace(-2, 2, 1000)
+        v = variableTypes.ContinuousVariable(values)
+        values[0] = -5.0
+        self.assertEqual(v.x[0], -2.0)
+
+    def testGridRefinement(self):
+        coarse = np.linspace(-10, 10, 50)
+        v = variableTypes.ContinuousVariable(coarse, refineEvery=1)
+        for i in range(10): #@UnusedVariable
+            v.alterSamplingDistribution(10.0, 1.0, 0.5)
+        x = v.x
+        self.assertEqual(len(x), 50)
+        self.assertTrue(np.all(np.diff(x) > 0))
+        self.assertTrue(np.min(np.diff(x)) < coarse[1] - coarse[0])
+        self.assertTrue(abs(x[np.argmin(np.diff(x))] - 1.0) < 1.0)
+        self.assertAlmostEqual(np.mean(v.rand(10000)), 1.0, 0)
+        v.refineGrid(200)
+        self.assertEqual(len(v.x), 200)
+        self.assertEqual(len(v.scores), 200)
+        self.assertEqual(len(v.pdfValues), 200)
+        v.alterSamplingDistributionBatch([1.0, 1.0], [0.5, 1.5], 0.5,
+                                         method='histogram')
+
+    def testMaxGridSizeIsACap(self):
+        coarse = np.linspace(-10, 10, 50)
+        for (maxGridSize, expected) in ((30, 30), (100, 50)):
+            v = variableTypes.ContinuousVariable(coarse, refineEvery=1,
+                                                 maxGridSize=maxGridSize)
+            v.alterSamplingDistribution(10.0, 1.0, 0.5)
+            self.assertEqual(len(v.x), expected)
+            v.refineGrid(200)
+            self.assertEqual(len(v.x), min(200, maxGridSize))
+
     def testUnsortedSamplingValues(self):
         cases = ([1., 2., 3., 0],
                  [9., 8., 7., 6],
@@ -212,6 +370,34 @@ class TestContinuousVariable(unittest.TestCase):
 
 
 
+    def testKernelTruncationErrorBound(self):
+        '''Truncated kernel updates stay within the documented bound'''
+        TIMES = 50
+        x = np.linspace(-2, 2, 1000)
+        width = 0.05
+        amount = np.random.randn(TIMES)
+        locations = np.random.uniform(-2, 2, TIMES)
+        for k in (3, 6):
+            bound = np.exp(-k ** 2 / 2.0) / (width * np.sqrt(2 * np.pi))
+            bound *= np.sum(np.abs(amount))
+            full = variableTypes.ContinuousVariable(x)
+            truncated = variableTypes.ContinuousVariable(x,
+                                                         kernelTruncation=k)
+            batch = variableTypes.ContinuousVariable(x, kernelTruncation=k)
+            for (a, loc) in zip(amount, locations):
+                full.alterSamplingDistribution(a, loc, width,
+                                               immediateApply=False)
+                truncated.alterSamplingDistribution(a, loc, width,
+                                                    immediateApply=False)
+            batch.alterSamplingDistributionBatch(amount, locations, width,
+                                                 immediateApply=False)
+            for obj in (truncated, batch):
+                err = np.max(np.abs(np.subtract(full.scores, obj.scores)))
+                self.assertTrue(err <= bound,
+                                'k=%d: error %g exceeds %g'%(k, err, bound))
+
+
+
 class TestIntegerVariable(unittest.TestCase):
     def testRaiseErrorOnImproperInitialization(self):
         values = [1, 1.01, 2, 3]
@@ -252,8 +438,68 @@ class TestIntegerVariable(unittest.TestCase):
                     lMsg.append(msg)
                 self.fail('.\n'.join(lMsg))
 
+    def testExactUpdates(self):
+        var = variableTypes.IntegerVariable(range(-5, 5))
+        var.alterSamplingDistribution(2.0, 3, 0, immediateApply=False)
+        var.alterSamplingDistributionBatch([1.0, 1.0, 0.5], [-5, 3, 4], 0,
+                                           immediateApply=False)
+        expected = np.zeros(10)
+        expected[[0, 8, 9]] = [1.0, 3.0, 0.5]
+        self.assertTrue(np.all(var.scores == expected))
+        self.assertEqual(var.scores.dtype, float)
+        self.assertRaises(ValueError, var.scores.__setitem__, 0, 1.0)
+        for location in (5, -6, 2.5):
+            self.assertRaises(ValueError, var.alterSamplingDistribution,
+                              1.0, location, 0)
+            self.assertRaises(ValueError, var.alterSamplingDistributionBatch,
+                              [1.0], [location], 0)
+        var.applySamplingScore()
+        self.assertTrue(np.all(var.scores == 0))
+
+    def testSamplers(self):
+        for sampler in ('alias', 'cdf'):
+            var = variableTypes.IntegerVariable([4, 5, 6], sampler=sampler)
+            var.alterSamplingDistribution(10.0, 5, 0)
+            s = var.rand(1000)
+            self.assertTrue(set(s) <= set([4, 5, 6]))
+            #the update raises the probability of 5 from 1/3 to about 0.55
+            self.assertTrue(np.mean(s == 5) > 0.45)
+        self.assertRaises(ValueError, variableTypes.IntegerVariable,
+                          [4, 5, 6], sampler='binary')
+
+
+
+
+
+class TestSparseIntegerVariable(unittest.TestCase):
+    def testOnlyTheSamplingValuesAreStored(self):
+        values = [1, 10 ** 6, 10 ** 9]
+        for sampler in ('alias', 'cdf'):
+            var = variableTypes.SparseIntegerVariable(values, sampler=sampler)
+            self.assertEqual(list(var.x), values)
+            self.assertEqual(set(var.rand(1000)), set(values))
 
+    def testUpdates(self):
+        values = 2 ** np.arange(20)
+        var = variableTypes.SparseIntegerVariable(values)
+        var.alterSamplingDistributionBatch([1.0, 2.0], [4, 1024], 0,
+                                           immediateApply=False)
+        var.alterSamplingDistribution(1.0, 1024, 0, immediateApply=False)
+        expected = np.zeros(20)
+        expected[[2, 10]] = [1.0, 3.0]
+        self.assertTrue(np.all(var.scores == expected))
+        for location in (3, 2 ** 20, 0):
+            self.assertRaises(ValueError, var.alterSamplingDistribution,
+                              1.0, location, 0)
+        var.applySamplingScore()
+        s = var.rand(10000)
+        self.assertTrue(np.mean(s == 1024) > np.mean(s == 2048))
+        var.alterSamplingDistribution(10.0, 2 ** 15, 1000.0)
+        self.assertTrue(set(var.rand(100)) <= set(values))
 
+    def testConflicts(self):
+        self.assertRaises(ValueError, variableTypes.SparseIntegerVariable,
+                          [1, 1.5, 1000])
 
 
 if __name__ == "__main__":